@@ -0,0 +1,533 @@
+"""Soxta Bot API ustida yuklama sinovi.
+
+Haqiqiy Application handler'lariga (bot.build_application) tayyor Update'lar
+beriladi; Telegram o'rniga FakeRequest javob qaytaradi. Baza vaqtinchalik
+papkada yaratilib to'ldiriladi, ssenariylar unda ketma-ket ishlaydi.
+Ssenariy update'lari bir vaqtda keladi, shuning uchun kechikishga
+PerUserUpdateProcessor navbatida kutish ham kiradi.
+
+    python bench.py
+    python bench.py --users 2000 --history 200000 --scenario burst check
+    python bench.py --history 0 --api-latency 50 --scenario polling webhook
+    python bench.py --history 0 --scenario lessons
+    python bench.py --history 0 --export-rows 500000 --scenario export
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+import httpx
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.warnings import PTBUserWarning
+
+import bot
+from export import FORMATS, export_gradebook
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+SCENARIOS = ('startup', 'lessons', 'burst', 'check', 'topmonth', 'polling', 'webhook', 'export')
+FIRST_USER_ID = 1000
+GROUP_CHAT = {'id': -1001000000000, 'type': 'supergroup', 'title': 'Bench'}
+CHECK_LESSON = 99  # /check ssenariysi uchun alohida dars
+BURST_LESSON = 50
+EXPORT_LESSON = 200  # export ssenariysi qo'shimcha topshiriqlari shu darsdan boshlanadi
+WEBHOOK_SECRET = 'bench-secret'
+POLL_TIMEOUT = 1  # getUpdates long-poll (soniya)
+SOURCE = b"a, b = map(int, input().split())\nprint(a + b)\n"
+
+
+# ============================================
+# SOXTA BOT API
+# ============================================
+class FakeRequest(BaseRequest):
+    """Bot API o'rniga: har bir metodga minimal to'g'ri javob, ixtiyoriy kechikish bilan.
+
+    getUpdates incoming navbatidagi update'larni long-poll qilib beradi;
+    waiters[chat_id] — shu chatga birinchi javob yuborilgan vaqtni oladi.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.incoming = None
+        self.waiters = {}
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params: dict) -> dict:
+        self._message_id += 1
+        chat_id = int(params.get('chat_id', 0))
+        return {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private'},
+            'text': params.get('text', ''),
+        }
+
+    def _answered(self, chat_id: int):
+        waiter = self.waiters.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+
+    async def _get_updates(self, timeout: float):
+        if self.incoming is None:
+            self.incoming = asyncio.Queue()
+        try:
+            updates = [await asyncio.wait_for(self.incoming.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.incoming.empty():
+            updates.append(self.incoming.get_nowait())
+        return updates
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        self.calls += 1
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint == 'getUpdates':
+            # Long-poll: update kelgach javob yana latency'dan keyin yetadi
+            updates = await self._get_updates(float(params.get('timeout') or 0))
+            if self.latency and updates:
+                await asyncio.sleep(self.latency)
+            return 200, json.dumps({'ok': True, 'result': updates}).encode()
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if '/file/bot' in url:
+            return 200, SOURCE
+
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif endpoint in ('sendMessage', 'sendDocument', 'editMessageText'):
+            result = self._message(params)
+            self._answered(result['chat']['id'])
+        elif endpoint == 'getFile':
+            result = {'file_id': params['file_id'], 'file_unique_id': params['file_id'],
+                      'file_size': len(SOURCE), 'file_path': f"documents/{params['file_id']}.py"}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+# ============================================
+# UPDATE'LAR
+# ============================================
+_update_ids = iter(range(1, 10 ** 9))
+
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f"Talaba{user_id}", 'username': f"user{user_id}"}
+
+
+def document_update(app, user_id: int, lesson_number: int) -> Update:
+    file_id = f"F{user_id}_{lesson_number}"
+    return Update.de_json({
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': GROUP_CHAT,
+            'from': _user(user_id),
+            'caption': f"#homework {lesson_number}-dars",
+            'document': {'file_id': file_id, 'file_unique_id': file_id,
+                         'file_name': f"dars{lesson_number}.py", 'file_size': len(SOURCE)},
+        },
+    }, app.bot)
+
+
+def command_payload(user_id: int, text: str) -> dict:
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': _user(user_id),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}],
+        },
+    }
+
+
+def command_update(app, user_id: int, text: str) -> Update:
+    return Update.de_json(command_payload(user_id, text), app.bot)
+
+
+def callback_update(app, user_id: int, data: str) -> Update:
+    return Update.de_json({
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(user_id),
+            'chat_instance': 'bench',
+            'data': data,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Bench'},
+                'text': 'panel',
+            },
+        },
+    }, app.bot)
+
+
+# ============================================
+# BAZANI TO'LDIRISH
+# ============================================
+def _seed(conn, users: int, submissions: int, history: int, check_entries: int):
+    rng = random.Random(42)
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users)
+    conn.executemany('INSERT INTO users (user_id, full_name, username) VALUES (?, ?, ?)',
+                     ((uid, f"Talaba{uid}", f"user{uid}") for uid in user_ids))
+
+    # Darslar ketma-ket to'ldiriladi: 1-dars hammada, keyin 2-dars, ...
+    rows = [(FIRST_USER_ID + i % users, 1 + i // users, f"F{i}", f"dars{1 + i // users}.py", rng.choice((0, 1, 2)))
+            for i in range(submissions)]
+    rows += [(FIRST_USER_ID + i, CHECK_LESSON, f"C{i}", f"dars{CHECK_LESSON}.py", 0)
+             for i in range(min(check_entries, users))]
+    conn.executemany('INSERT INTO homework (user_id, lesson_number, file_id, filename, status) VALUES (?, ?, ?, ?, ?)',
+                     rows)
+
+    now = datetime.utcnow()
+    totals = {}
+    batch = []
+    for _ in range(history):
+        uid = rng.choice(user_ids)
+        points = rng.choice((1, 1, 1, 3))
+        totals[uid] = totals.get(uid, 0) + points
+        ts = now - timedelta(seconds=rng.randrange(40 * 86400))
+        batch.append((uid, points, "bench", ts.strftime('%Y-%m-%d %H:%M:%S')))
+        if len(batch) >= 50000:
+            conn.executemany('INSERT INTO score_history (user_id, points, reason, timestamp) VALUES (?, ?, ?, ?)', batch)
+            batch = []
+    conn.executemany('INSERT INTO score_history (user_id, points, reason, timestamp) VALUES (?, ?, ?, ?)', batch)
+    conn.executemany('INSERT INTO scores (user_id, score) VALUES (?, ?)', totals.items())
+
+    # lesson_stats xuddi migratsiyadagidek homework'dan hisoblanadi
+    bot._migration_3(conn)
+
+
+# ============================================
+# O'LCHASH
+# ============================================
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sql):
+        with self._lock:
+            self.count += 1
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_updates(app, updates):
+    """Update'larni PerUserUpdateProcessor orqali bir vaqtda beradi; har birining kechikishi (s)."""
+    latencies = []
+
+    async def one(update):
+        started = time.perf_counter()
+        await app.update_processor.process_update(update, app.process_update(update))
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(update) for update in updates))
+    return latencies
+
+
+async def measure(name: str, app, fake, counter, updates):
+    calls, statements = fake.calls, counter.count
+    started = time.perf_counter()
+    latencies = await run_updates(app, updates)
+    await bot.db_writer.flush()
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': name,
+        'updates': len(updates),
+        'seconds': elapsed,
+        'throughput': len(updates) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'statements': counter.count - statements,
+        'api_calls': fake.calls - calls,
+    }
+
+
+async def measure_transport(name: str, fake, counter, send, count: int):
+    """Update'ni transportga berishdan javob Bot API'ga yetguncha (ketma-ket, bittadan)."""
+    loop = asyncio.get_running_loop()
+    calls, statements = fake.calls, counter.count
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        user_id = FIRST_USER_ID + i
+        done = fake.waiters[user_id] = loop.create_future()
+        sent = time.perf_counter()
+        await send(command_payload(user_id, '/myid'))
+        latencies.append(await asyncio.wait_for(done, 10) - sent)
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': name,
+        'updates': count,
+        'seconds': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'statements': counter.count - statements,
+        'api_calls': fake.calls - calls,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def bench_polling(app, fake, counter, count: int):
+    fake.incoming = asyncio.Queue()
+    await app.updater.start_polling(poll_interval=0, timeout=POLL_TIMEOUT)
+    try:
+        async def send(payload):
+            fake.incoming.put_nowait(payload)
+        return await measure_transport('polling', fake, counter, send, count)
+    finally:
+        await app.updater.stop()
+
+
+async def bench_webhook(app, fake, counter, count: int):
+    port = _free_port()
+    await app.updater.start_webhook(listen='127.0.0.1', port=port, url_path='telegram',
+                                    secret_token=WEBHOOK_SECRET, webhook_url='https://bench.invalid/telegram')
+    try:
+        async with httpx.AsyncClient() as client:
+            async def send(payload):
+                response = await client.post(
+                    f'http://127.0.0.1:{port}/telegram', json=payload,
+                    headers={'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET}
+                )
+                response.raise_for_status()
+            return await measure_transport('webhook', fake, counter, send, count)
+    finally:
+        await app.updater.stop()
+
+
+# Hashteg va dars raqamini ajratish uchun namunaviy caption/fayl nomlari
+CAPTIONS = (
+    "#homework {n}-dars", "#uyishi Dars {n}", "#HW {n}", "#vazifa lesson_{n}", "Bugungi #uyishi",
+    "#homework", "{n}-chi dars vazifasi", "uy ishi {n}", "", "#hw hw-{n} yakuniy variant",
+)
+FILENAMES = ("main.py", "dars{n}.py", "hw_{n}.py", "lesson-{n}.txt", "yechim.py", "task.py")
+
+
+def bench_lessons(count: int):
+    """submission_filter() dagi kabi: caption hashtegi va caption + fayl nomidan dars raqami."""
+    rng = random.Random(42)
+    samples = [(rng.choice(CAPTIONS).format(n=rng.randint(1, 120)),
+                rng.choice(FILENAMES).format(n=rng.randint(1, 120)))
+               for _ in range(1000)]
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        caption, filename = samples[i % len(samples)]
+        t = time.perf_counter()
+        bot.parse_submission(caption, filename)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': 'lessons',
+        'updates': count,
+        'seconds': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'statements': 0,
+        'api_calls': 0,
+    }
+
+
+def _seed_export(conn, users: int, rows: int):
+    # homework jami kamida rows ta bo'lguncha — har bir talabaga yangi darslar
+    missing = rows - conn.execute('SELECT COUNT(*) FROM homework').fetchone()[0]
+    conn.executemany(
+        'INSERT INTO homework (user_id, lesson_number, file_id, filename, status) VALUES (?, ?, ?, ?, ?)',
+        ((FIRST_USER_ID + i % users, EXPORT_LESSON + i // users, f"E{i}", "main.py", i % 3)
+         for i in range(max(missing, 0)))
+    )
+
+
+async def bench_export(counter, fmt: str, rows: int, users: int):
+    """export_gradebook: qator/s (kuzatuvsiz) va tracemalloc bo'yicha eng yuqori xotira."""
+    await bot.db.run(_seed_export, users, rows)
+    path = os.path.abspath(f'gradebook.{fmt}.gz')
+    statements = counter.count
+    started = time.perf_counter()
+    count = await bot.db.run(export_gradebook, path, fmt)
+    elapsed = time.perf_counter() - started
+    statements = counter.count - statements
+
+    # Alohida o'tish: tracemalloc barcha thread'lardagi Python ajratmalarini sekinlashtiradi
+    tracemalloc.start()
+    try:
+        await bot.db.run(export_gradebook, path, fmt)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'scenario': 'export',
+        'updates': count,
+        'seconds': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'p50_ms': elapsed * 1000,
+        'p99_ms': elapsed * 1000,
+        'statements': statements,
+        'api_calls': 0,
+        'peak_mb': peak / 1024 / 1024,
+        'file_mb': os.path.getsize(path) / 1024 / 1024,
+    }
+
+
+# ============================================
+# SSENARIYLAR
+# ============================================
+async def bench(args):
+    fake = FakeRequest(args.api_latency / 1000)
+    counter = StatementCounter()
+    results = []
+
+    bot.db.migrate(bot.MIGRATIONS)
+    bot.db.call(_seed, args.users, args.submissions, args.history, args.check_entries)
+
+    # Ishga tushish: leaderboard'ni butun score_history oynasidan yuklash
+    bot.db.set_trace(counter)
+    started = time.perf_counter()
+    bot.init_db()
+    elapsed = time.perf_counter() - started
+    if 'startup' in args.scenario:
+        results.append({'scenario': 'startup', 'updates': 0, 'seconds': elapsed, 'throughput': 0.0,
+                        'p50_ms': elapsed * 1000, 'p99_ms': elapsed * 1000,
+                        'statements': counter.count, 'api_calls': 0})
+    if 'lessons' in args.scenario:
+        results.append(bench_lessons(args.lessons))
+
+    warnings.filterwarnings('ignore', category=PTBUserWarning)
+    app = bot.build_application(request=fake)
+    await app.initialize()
+    await bot.on_startup(app)
+    await app.start()  # Updater'siz — update'lar to'g'ridan-to'g'ri beriladi
+    admin = bot.SUPER_ADMIN
+    try:
+        if 'topmonth' in args.scenario:
+            updates = [command_update(app, FIRST_USER_ID + i % args.users, '/topmonth') for i in range(args.repeat)]
+            results.append(await measure('topmonth', app, fake, counter, updates))
+
+        if 'check' in args.scenario:
+            # /check va keyingi sahifalar (keyset sahifalash)
+            ids = [row[0] for row in await bot.db.fetchall(
+                'SELECT id FROM homework WHERE lesson_number = ? ORDER BY timestamp, id', (CHECK_LESSON,))]
+            anchors = ids[bot.REVIEW_PAGE_SIZE - 1::bot.REVIEW_PAGE_SIZE] or [0]
+            updates = []
+            for i in range(args.repeat):
+                updates.append(command_update(app, admin, f"/check {CHECK_LESSON}"))
+                updates.append(callback_update(app, admin, f"page_{CHECK_LESSON}_n_{anchors[i % len(anchors)]}"))
+            results.append(await measure('check', app, fake, counter, updates))
+
+        if 'burst' in args.scenario:
+            # Har bir talaba bitta yangi dars topshiradi, har o'ninchisi qayta yuboradi
+            updates = [document_update(app, FIRST_USER_ID + i % args.users, BURST_LESSON + i // args.users)
+                       for i in range(args.burst)]
+            updates += [document_update(app, FIRST_USER_ID + i % args.users, BURST_LESSON + i // args.users)
+                        for i in range(0, args.burst, 10)]
+            results.append(await measure('burst', app, fake, counter, updates))
+
+        # Transport: long polling va webhook (lokal HTTP) orqali bir xil /myid
+        if 'polling' in args.scenario:
+            results.append(await bench_polling(app, fake, counter, args.repeat))
+        if 'webhook' in args.scenario:
+            results.append(await bench_webhook(app, fake, counter, args.repeat))
+
+        if 'export' in args.scenario:
+            results.append(await bench_export(counter, args.export_format, args.export_rows, args.users))
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await bot.on_shutdown(app)
+
+    return results
+
+
+def report(results, args):
+    print(f"users={args.users} submissions={args.submissions} history={args.history} "
+          f"api_latency={args.api_latency}ms")
+    print(f"{'ssenariy':<10} {'update':>7} {'soniya':>8} {'upd/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'SQL':>8} {'SQL/upd':>8} {'API':>6}")
+    for r in results:
+        per_update = r['statements'] / r['updates'] if r['updates'] else r['statements']
+        print(f"{r['scenario']:<10} {r['updates']:>7} {r['seconds']:>8.3f} {r['throughput']:>9.1f} "
+              f"{r['p50_ms']:>9.4g} {r['p99_ms']:>9.4g} {r['statements']:>8} {per_update:>8.1f} {r['api_calls']:>6}")
+    for r in results:
+        if 'peak_mb' in r:
+            print(f"{r['scenario']}: {r['updates']} qator, {r['throughput']:.0f} qator/s, "
+                  f"eng yuqori xotira {r['peak_mb']:.2f} MB, fayl {r['file_mb']:.2f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soxta Bot API ustida handler'lar benchmarki")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--submissions', type=int, default=5000, help="Oldindan to'ldirilgan topshiriqlar")
+    parser.add_argument('--history', type=int, default=1_000_000, help="score_history qatorlari")
+    parser.add_argument('--check-entries', type=int, default=100, help="/check qilinadigan darsdagi topshiriqlar")
+    parser.add_argument('--burst', type=int, default=1000, help="burst ssenariysidagi yangi topshiriqlar")
+    parser.add_argument('--repeat', type=int, default=200, help="/check, /topmonth va transport takrorlari")
+    parser.add_argument('--lessons', type=int, default=100_000, help="lessons ssenariysidagi caption'lar")
+    parser.add_argument('--export-rows', type=int, default=100_000, help="export ssenariysidagi homework qatorlari")
+    parser.add_argument('--export-format', choices=FORMATS, default='csv')
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Soxta Bot API kechikishi (ms)")
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--json', action='store_true', help="Natijani JSON ko'rinishida chiqarish")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='homework-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)  # homework.db va submissions/ shu yerda yaratiladi
+    try:
+        results = asyncio.run(bench(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,26 @@
+import argparse
+import asyncio
+import html
+import logging
 import os
 import re
-import sqlite3
+import sys
+import tempfile
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, \
-    ConversationHandler
+    ConversationHandler, BaseUpdateProcessor
+from telegram.error import BadRequest, Forbidden
+
+from export import FORMATS, export_gradebook
+from grading import Grader
+from leaderboard import Leaderboard
+from metrics import REGISTRY, TimedRequest, instrument, serve as serve_metrics
+from outbox import Outbox
+from persistence import SQLitePersistence
+from storage import Storage, WriteBehind
+from submissions import ContentStore, FileCache, SimilarityIndex, minhash, pack_signature, unpack_signature
+from users import UPSERT_USER_SQL, UserDirectory
 
 # ============================================
 # SOZLAMALAR
@@ -20,15 +36,80 @@ MODE = "HASHTAG"  # Variantlar: "HASHTAG", "REPLY", "CAPTION_ONLY"
 # Hashteg sozlamalari (MODE = "HASHTAG" bo'lsa)
 VALID_HASHTAGS = ['#homework', '#uyishi', '#vazifa', '#hw']
 
+# UPDATE OLISH REJIMI: "POLLING" yoki "WEBHOOK"
+RUN_MODE = "POLLING"
+
+# Webhook sozlamalari (RUN_MODE = "WEBHOOK" bo'lsa)
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', "")  # Tashqi manzil, masalan https://bot.example.com (majburiy)
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = int(os.environ.get('PORT', 8443))
+WEBHOOK_PATH = "telegram"
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', "")  # X-Telegram-Bot-Api-Secret-Token (majburiy)
+
+# Topshiriqlarni yuklab olib saqlash va o'xshashlarini aniqlash (ixtiyoriy)
+INGEST_ENABLED = False
+INGEST_CONCURRENCY = 4
+INGEST_MAX_BYTES = 1024 * 1024
+
+# .py topshiriqlarni grading/<dars>.json testlari bilan avtomatik oldindan tekshirish (ixtiyoriy)
+AUTOGRADE_ENABLED = False
+
+# /check panelidagi fayllarni oldindan yuklab, diskda keshlash (👁 ko'rish uchun)
+FILE_CACHE_ENABLED = True
+PREVIEW_LINES = 40
+
+# Prometheus matn formatidagi /metrics endpoint (0 — o'chirilgan)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+
+# Qabul qilingan, lekin hali ishlanmagan update'lar navbati chegarasi
+UPDATE_QUEUE_SIZE = 1000
+
+# Navbatdan olingan, lekin hali tugamagan update'lar (task'lar) chegarasi.
+# Yetganda navbatdan olish to'xtaydi, navbat to'lsa webhook so'rovi kutadi.
+UPDATE_IN_FLIGHT_LIMIT = 200
+
+# Bir vaqtda qayta ishlanadigan update'lar soni (1 — ketma-ket)
+CONCURRENT_UPDATES = 16
+
+# /check panelida bir sahifadagi topshiriqlar soni
+REVIEW_PAGE_SIZE = 8
+
+# Telegram xabar uzunligi limiti
+MAX_MESSAGE_LENGTH = 4096
+
 # Conversation states
 WAITING_FOR_FEEDBACK = 1
 
 
+logger = logging.getLogger(__name__)
+
+
 # ============================================
 # BAZA
 # ============================================
-def init_db():
-    conn = sqlite3.connect('homework.db')
+db = Storage()
+leaderboard = Leaderboard()
+db_writer = WriteBehind(db)
+outbox = Outbox()
+users = UserDirectory(db)
+content_store = ContentStore()
+similarity_index = SimilarityIndex()
+file_cache = FileCache()
+grader = Grader()
+_downloads = {}  # file_id -> bir vaqtdagi yuklashlarni birlashtiruvchi Task
+_download_slots = asyncio.Semaphore(INGEST_CONCURRENCY)
+_metrics_server = None
+
+REGISTRY.register('db_writer', db_writer.metrics)
+REGISTRY.register('outbox', outbox.metrics)
+REGISTRY.register('users', users.metrics)
+REGISTRY.register('file_cache', file_cache.metrics)
+REGISTRY.register('grader', grader.metrics)
+
+
+def _migration_1(conn):
+    # Boshlang'ich sxema (IF NOT EXISTS — eski bazalar ham mos keladi)
     cur = conn.cursor()
 
     cur.execute('''
@@ -78,97 +159,351 @@ def init_db():
         )
     ''')
 
+
+def _migration_2(conn):
+    # Takroriy (user_id, lesson_number) yozuvlardan faqat oxirgisi qoladi
+    conn.execute('''
+        DELETE FROM homework
+        WHERE id NOT IN (SELECT MAX(id) FROM homework GROUP BY user_id, lesson_number)
+    ''')
+    conn.execute('ALTER TABLE homework ADD COLUMN attempts INTEGER DEFAULT 1')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_homework_user_lesson
+        ON homework (user_id, lesson_number)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_homework_lesson_time
+        ON homework (lesson_number, timestamp)
+    ''')
+    # points ham qo'shilgan — /topweek va /topmonth jadvalga murojaat qilmaydi
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_score_history_time_user
+        ON score_history (timestamp, user_id, points)
+    ''')
+
+
+def _migration_3(conn):
+    # Har bir dars bo'yicha holatlar soni (homework bilan bir tranzaksiyada yangilanadi)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lesson_stats (
+            lesson_number INTEGER PRIMARY KEY,
+            submitted INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            approved INTEGER NOT NULL DEFAULT 0,
+            needs_fix INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO lesson_stats (lesson_number, submitted, pending, approved, needs_fix)
+        SELECT lesson_number,
+               COUNT(*),
+               SUM(status = 0),
+               SUM(status = 1),
+               SUM(status = 2)
+        FROM homework
+        GROUP BY lesson_number
+    ''')
+
+
+def _migration_4(conn):
+    # SQLitePersistence jadvallari (persistence.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS persistence_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS persistence_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        )
+    ''')
+
+
+def _migration_5(conn):
+    conn.execute('ALTER TABLE homework ADD COLUMN content_hash TEXT')
+    conn.execute('ALTER TABLE homework ADD COLUMN duplicate_of INTEGER')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS submission_fingerprints (
+            homework_id INTEGER PRIMARY KEY,
+            lesson_number INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            minhash BLOB NOT NULL
+        )
+    ''')
+
+
+def _migration_6(conn):
+    # Avtomatik tekshiruv natijasi: NULL — tekshirilmagan
+    conn.execute('ALTER TABLE homework ADD COLUMN pregrade_passed INTEGER')
+    conn.execute('ALTER TABLE homework ADD COLUMN pregrade_total INTEGER')
+
+
+# (versiya, funksiya) — yangi o'zgarishlar faqat ro'yxat oxiriga qo'shiladi
+MIGRATIONS = [
+    (1, _migration_1),
+    (2, _migration_2),
+    (3, _migration_3),
+    (4, _migration_4),
+    (5, _migration_5),
+    (6, _migration_6),
+]
+
+
+def _seed_admins(conn):
     for admin_id in ADMINS:
-        cur.execute('INSERT OR IGNORE INTO admins VALUES (?)', (admin_id,))
+        conn.execute('INSERT OR IGNORE INTO admins VALUES (?)', (admin_id,))
+
+
+def init_db():
+    db.migrate(MIGRATIONS)
+    db.call(_seed_admins)
+    load_admins()
+    load_leaderboard()
+    if INGEST_ENABLED:
+        load_fingerprints()
+
+
+def _leaderboard_rows(conn):
+    # Eng uzun oynani qoplash uchun bir kun zaxira bilan
+    days = max(leaderboard.windows.values()) + 1
+    since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    names = conn.execute('SELECT user_id, full_name FROM users').fetchall()
+    scores = conn.execute('SELECT user_id, score FROM scores').fetchall()
+    history = conn.execute('''
+        SELECT user_id, points, timestamp FROM score_history
+        WHERE timestamp >= ?
+    ''', (since,)).fetchall()
+    return names, scores, history
 
-    conn.commit()
-    conn.close()
+
+def load_leaderboard():
+    leaderboard.load(*db.call(_leaderboard_rows))
 
 
 # ============================================
 # YORDAMCHI FUNKSIYALAR
 # ============================================
-def is_admin(user_id: int) -> bool:
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('SELECT user_id FROM admins WHERE user_id = ?', (user_id,))
-    result = cur.fetchone()
-    conn.close()
-    return result is not None
+# Adminlar keshi — admins jadvalining xotiradagi nusxasi.
+# Jadvalga yozuvchi har bir yo'l (grant_admin, revoke_admin) keshni ham yangilaydi.
+_admin_ids = set()
 
 
-def is_super_admin(user_id: int) -> bool:
-    return user_id == SUPER_ADMIN
+def load_admins():
+    rows = db.call(lambda conn: conn.execute('SELECT user_id FROM admins').fetchall())
+    _admin_ids.clear()
+    _admin_ids.update(row[0] for row in rows)
 
 
-def add_or_update_user(user_id: int, full_name: str, username: str):
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO users (user_id, full_name, username) 
-        VALUES (?, ?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET 
-            full_name = excluded.full_name,
-            username = excluded.username
-    ''', (user_id, full_name, username))
-    conn.commit()
-    conn.close()
-
-
-def has_valid_hashtag(text: str) -> bool:
-    if not text:
-        return False
-    text_lower = text.lower()
-    return any(hashtag in text_lower for hashtag in VALID_HASHTAGS)
+async def grant_admin(user_id: int):
+    await db.execute('INSERT OR IGNORE INTO admins VALUES (?)', (user_id,))
+    _admin_ids.add(user_id)
+    _not_done_cache.clear()
 
 
-def extract_lesson_number(text: str) -> int:
-    if not text:
-        return None
+async def revoke_admin(user_id: int):
+    await db.execute('DELETE FROM admins WHERE user_id = ?', (user_id,))
+    _admin_ids.discard(user_id)
+    _not_done_cache.clear()
 
-    patterns = [
-        r'dars[_\s-]*(\d+)',
-        r'(?:hw|homework)[_\s-]*(\d+)',
-        r'(?:lesson)[_\s-]*(\d+)',
-        r'(\d+)[_\s-]*(?:dars|chi)',
-        r'#\w*\s*(\d+)',
-        r'(?:^|\s)(\d{1,3})(?:\s|$|\.)',
-    ]
 
-    for pattern in patterns:
-        match = re.search(pattern, text.lower())
+def is_admin(user_id: int) -> bool:
+    return user_id in _admin_ids
+
+
+def is_super_admin(user_id: int) -> bool:
+    return user_id == SUPER_ADMIN
+
+
+ADD_SCORE_SQL = '''
+    INSERT INTO scores (user_id, score) VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET score = score + ?
+'''
+
+ADD_HISTORY_SQL = '''
+    INSERT INTO score_history (user_id, points, reason)
+    VALUES (?, ?, ?)
+'''
+
+async def add_or_update_user(user_id: int, full_name: str, username: str):
+    if await users.upsert(user_id, full_name, username):
+        leaderboard.set_name(user_id, full_name)
+        _not_done_cache.clear()
+
+
+def split_message(header: str, lines, limit: int = MAX_MESSAGE_LENGTH):
+    """Qatorlarni Telegram limitidan oshmaydigan xabarlarga bo'lish."""
+    chunks = []
+    current = header
+    for line in lines:
+        if len(current) + len(line) + 1 > limit and current:
+            chunks.append(current)
+            current = ""
+        current += line + "\n"
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Bir marta kompilyatsiya qilinadi. Tartib muhim: birinchi mos kelgan
+# (va 1..100 oralig'idagi) shablon g'olib.
+LESSON_PATTERNS = tuple(re.compile(pattern) for pattern in [
+    r'dars[_\s-]*(\d+)',
+    r'(?:hw|homework)[_\s-]*(\d+)',
+    r'(?:lesson)[_\s-]*(\d+)',
+    r'(\d+)[_\s-]*(?:dars|chi)',
+    r'#\w*\s*(\d+)',
+    r'(?:^|\s)(\d{1,3})(?:\s|$|\.)',
+])
+
+HASHTAG_RE = re.compile('|'.join(re.escape(hashtag) for hashtag in VALID_HASHTAGS))
+
+
+def parse_submission(caption: str, filename: str):
+    """(caption'da hashteg bormi, dars raqami yoki None).
+
+    Caption va fayl nomi bitta kichik harfli matnga bir marta aylantiriladi;
+    dars raqami shu matndan LESSON_PATTERNS tartibida qidiriladi.
+    """
+    caption = (caption or "").lower()
+    has_hashtag = HASHTAG_RE.search(caption) is not None
+    text = f"{caption} {(filename or '').lower()}"
+    for pattern in LESSON_PATTERNS:
+        match = pattern.search(text)
         if match:
             num = int(match.group(1))
             if 1 <= num <= 100:
-                return num
-    return None
+                return has_hashtag, num
+    return has_hashtag, None
 
 
 def add_score(user_id: int, points: int, reason: str = ""):
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
+    # Bazaga db_writer orqali to'plab yoziladi, reyting darhol yangilanadi
+    db_writer.add(ADD_SCORE_SQL, (user_id, points, points))
+    db_writer.add(ADD_HISTORY_SQL, (user_id, points, reason))
 
-    cur.execute('''
-        INSERT INTO scores (user_id, score) VALUES (?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET score = score + ?
-    ''', (user_id, points, points))
+    leaderboard.add(user_id, points)
 
-    cur.execute('''
-        INSERT INTO score_history (user_id, points, reason)
-        VALUES (?, ?, ?)
-    ''', (user_id, points, reason))
 
-    conn.commit()
-    conn.close()
+def set_score(user_id: int, points: int) -> int:
+    """Ballni o'rnatadi va avvalgisini qaytaradi.
 
+    Bazaga farq (points - avvalgi) qo'shiladi: to'g'ridan-to'g'ri yozadigan
+    score = score + ? tranzaksiyalari bilan tartibidan qat'i nazar mos keladi.
+    """
+    old_score = leaderboard.totals.get(user_id, 0)
+    delta = points - old_score
+    db_writer.add(ADD_SCORE_SQL, (user_id, delta, delta))
+    db_writer.add(ADD_HISTORY_SQL, (user_id, delta, f"Admin ball o'rnatdi: {old_score} → {points}"))
+    leaderboard.set_total(user_id, points)
+    return old_score
 
-def is_first_submission(lesson_number: int) -> bool:
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM homework WHERE lesson_number = ?', (lesson_number,))
-    count = cur.fetchone()[0]
-    conn.close()
-    return count == 0
+
+STATUS_COLUMNS = {0: 'pending', 1: 'approved', 2: 'needs_fix'}
+
+
+def _update_lesson_stats(conn, lesson_number: int, old_status, new_status: int):
+    """lesson_stats'ni holat o'tishiga moslash; old_status None — yangi topshiriq."""
+    if old_status == new_status:
+        return
+    changes = [f"{STATUS_COLUMNS[new_status]} = {STATUS_COLUMNS[new_status]} + 1"]
+    if old_status is None:
+        changes.append("submitted = submitted + 1")
+    else:
+        changes.append(f"{STATUS_COLUMNS[old_status]} = {STATUS_COLUMNS[old_status]} - 1")
+    conn.execute('INSERT OR IGNORE INTO lesson_stats (lesson_number) VALUES (?)', (lesson_number,))
+    conn.execute(f"UPDATE lesson_stats SET {', '.join(changes)} WHERE lesson_number = ?", (lesson_number,))
+
+
+def _set_homework_status(conn, hw_id: int, status: int, comment: str = None):
+    """Topshiriq holatini o'zgartiradi va avvalgi holatni qaytaradi (topilmasa None)."""
+    conn.execute('BEGIN IMMEDIATE')
+    row = conn.execute('SELECT lesson_number, status FROM homework WHERE id = ?', (hw_id,)).fetchone()
+    if row is None:
+        return None
+    lesson_number, old_status = row
+    if comment is None:
+        conn.execute('UPDATE homework SET status = ? WHERE id = ?', (status, hw_id))
+    else:
+        conn.execute('UPDATE homework SET status = ?, comment = ? WHERE id = ?', (status, comment, hw_id))
+    _update_lesson_stats(conn, lesson_number, old_status, status)
+    return old_status
+
+
+def get_lesson_stats(conn, lesson_number: int):
+    row = conn.execute('''
+        SELECT submitted, pending, approved, needs_fix FROM lesson_stats WHERE lesson_number = ?
+    ''', (lesson_number,)).fetchone()
+    return row or (0, 0, 0, 0)
+
+
+def _submit_homework(conn, user_id, profile, lesson_number, file_id, filename):
+    # (almashtirilgan topshiriq id yoki None, yangi, birinchi, ball)
+    # IMMEDIATE — bir vaqtda kelgan topshiriqlar "birinchi"ni navbat bilan aniqlaydi
+    conn.execute('BEGIN IMMEDIATE')
+    if profile is not None:
+        conn.execute(UPSERT_USER_SQL, (user_id, *profile))
+
+    first = get_lesson_stats(conn, lesson_number)[0] == 0
+    existing = conn.execute('''
+        SELECT id, status FROM homework WHERE user_id = ? AND lesson_number = ?
+    ''', (user_id, lesson_number)).fetchone()
+
+    conn.execute('''
+        INSERT INTO homework (user_id, lesson_number, file_id, filename, status)
+        VALUES (?, ?, ?, ?, 0)
+        ON CONFLICT(user_id, lesson_number) DO UPDATE SET
+            file_id = excluded.file_id,
+            filename = excluded.filename,
+            status = 0,
+            comment = NULL,
+            timestamp = CURRENT_TIMESTAMP,
+            attempts = attempts + 1,
+            content_hash = NULL,
+            duplicate_of = NULL,
+            pregrade_passed = NULL,
+            pregrade_total = NULL
+    ''', (user_id, lesson_number, file_id, filename))
+    _update_lesson_stats(conn, lesson_number, existing[1] if existing else None, 0)
+
+    if existing:
+        # Eski fayl izi: yangi fayl yuklanmasa ham unga qarab 🔁 belgilanmasin
+        conn.execute('DELETE FROM submission_fingerprints WHERE homework_id = ?', (existing[0],))
+        return existing[0], False, False, 0
+
+    if first:
+        points, reason = 3, f"{lesson_number}-dars (birinchi)"
+    else:
+        points, reason = 1, f"{lesson_number}-dars"
+    conn.execute(ADD_SCORE_SQL, (user_id, points, points))
+    conn.execute(ADD_HISTORY_SQL, (user_id, points, reason))
+    return None, True, first, points
+
+
+async def submit_homework(user, lesson_number: int, file_id: str, filename: str):
+    """Foydalanuvchi, topshiriq va ballni bitta tranzaksiyada saqlaydi.
+
+    (yangi, birinchi, ball) qaytaradi; qayta topshirilganda ball berilmaydi.
+    """
+    profile = (user.full_name, user.username or "")
+    changed = users.changed(user.id, *profile)
+    replaced_id, is_new, first, points = await db.run(
+        _submit_homework, user.id, profile if changed else None, lesson_number, file_id, filename
+    )
+    if replaced_id is not None:
+        similarity_index.remove(replaced_id)
+    if changed:
+        users.remember(user.id, *profile)
+        leaderboard.set_name(user.id, user.full_name)
+        _not_done_cache.clear()
+    elif is_new:
+        _not_done_cache.pop(lesson_number, None)
+    if points:
+        leaderboard.add(user.id, points)
+    return is_new, first, points
 
 
 # ============================================
@@ -176,7 +511,7 @@ def is_first_submission(lesson_number: int) -> bool:
 # ============================================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    add_or_update_user(user.id, user.full_name, user.username or "")
+    await add_or_update_user(user.id, user.full_name, user.username or "")
 
     mode_info = {
         "HASHTAG": f"Caption'ga hashteg qo'shing: {', '.join(VALID_HASHTAGS)}",
@@ -189,6 +524,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         admin_text += "📋 **Mavjud komandalar:**\n"
         admin_text += "/check <dars> — Tekshirish\n"
         admin_text += "/notdone <dars> — Topshirmaganlar\n"
+        admin_text += "/stats <dars> — Dars statistikasi\n"
+        admin_text += "/approveall <dars> — Hammasini tasdiqlash\n"
+        admin_text += "/export — Baholar jadvali (CSV)\n"
+        admin_text += "/metrics — Bot ishlash ko'rsatkichlari\n"
         admin_text += "/top — Umumiy reyting\n"
         admin_text += "/topweek — Haftalik reyting\n"
         admin_text += "/topmonth — Oylik reyting\n"
@@ -200,6 +539,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             admin_text += "/addpoints <id> <ball> — Ball qo'shish\n"
             admin_text += "/removepoints <id> <ball> — Ball ayirish\n"
             admin_text += "/setpoints <id> <ball> — Ballni o'rnatish\n"
+            admin_text += "/bulkpoints <ball> <id> <id>... — Ko'pchilikka ball\n"
 
         await update.message.reply_text(admin_text, parse_mode='Markdown')
     else:
@@ -248,26 +588,29 @@ async def myid(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def my_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
+    results = await db.fetchall('''
         SELECT lesson_number, status, comment, timestamp
         FROM homework 
         WHERE user_id = ? 
         ORDER BY lesson_number DESC
     ''', (user_id,))
-    results = cur.fetchall()
 
-    cur.execute('SELECT score FROM scores WHERE user_id = ?', (user_id,))
-    score_result = cur.fetchone()
-    score = score_result[0] if score_result else 0
-    conn.close()
+    score = leaderboard.totals.get(user_id, 0)
 
     if not results:
         await update.message.reply_text("📭 Hali uy vazifa topshirilmagan.")
         return
 
-    message = f"📊 **Sizning natijalaringiz:**\n\n⭐ Jami ball: **{score}**\n\n"
+    message = f"📊 **Sizning natijalaringiz:**\n\n⭐ Jami ball: **{score}**\n"
+
+    standing = leaderboard.rank(user_id)
+    if standing:
+        position, total, percent = standing
+        message += f"🏅 O'rin: **{position}** / {total} (eng yaxshi {percent:.0f}%)\n"
+        for other_position, name, other_score, is_me in leaderboard.neighbours(user_id):
+            pointer = '👉' if is_me else '  '
+            message += f"{pointer} {other_position}. {name} – {other_score} ball\n"
+    message += "\n"
 
     for lesson, status, comment, timestamp in results:
         status_emoji = {0: '⏳', 1: '✅', 2: '✏️'}
@@ -278,18 +621,7 @@ async def my_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def top_students(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT u.full_name, s.score 
-        FROM scores s
-        JOIN users u ON s.user_id = u.user_id
-        WHERE s.score > 0
-        ORDER BY s.score DESC
-        LIMIT 10
-    ''')
-    results = cur.fetchall()
-    conn.close()
+    results = leaderboard.top(10)
 
     if not results:
         await update.message.reply_text("📊 Hali reyting mavjud emas.")
@@ -300,25 +632,17 @@ async def top_students(update: Update, context: ContextTypes.DEFAULT_TYPE):
         medal = {1: '🥇', 2: '🥈', 3: '🥉'}.get(idx, '  ')
         message += f"{medal} **{idx}.** {name} – {score} ball\n"
 
+    standing = leaderboard.rank(update.effective_user.id)
+    if standing and standing[0] > len(results):
+        position, total, _ = standing
+        my_score = leaderboard.totals[update.effective_user.id]
+        message += f"\n👤 Siz: **{position}**-o'rin / {total} – {my_score} ball\n"
+
     await update.message.reply_text(message, parse_mode='Markdown')
 
 
 async def top_week(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    week_ago = datetime.now() - timedelta(days=7)
-
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT u.full_name, SUM(sh.points) as total
-        FROM score_history sh
-        JOIN users u ON sh.user_id = u.user_id
-        WHERE sh.timestamp >= ?
-        GROUP BY sh.user_id
-        ORDER BY total DESC
-        LIMIT 10
-    ''', (week_ago,))
-    results = cur.fetchall()
-    conn.close()
+    results = leaderboard.top_window('week', 10)
 
     if not results:
         await update.message.reply_text("📊 Bu hafta hali ball yo'q.")
@@ -333,21 +657,7 @@ async def top_week(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def top_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    month_ago = datetime.now() - timedelta(days=30)
-
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT u.full_name, SUM(sh.points) as total
-        FROM score_history sh
-        JOIN users u ON sh.user_id = u.user_id
-        WHERE sh.timestamp >= ?
-        GROUP BY sh.user_id
-        ORDER BY total DESC
-        LIMIT 10
-    ''', (month_ago,))
-    results = cur.fetchall()
-    conn.close()
+    results = leaderboard.top_window('month', 10)
 
     if not results:
         await update.message.reply_text("📊 Bu oy hali ball yo'q.")
@@ -372,11 +682,7 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         new_admin_id = int(context.args[0])
-        conn = sqlite3.connect('homework.db')
-        cur = conn.cursor()
-        cur.execute('INSERT OR IGNORE INTO admins VALUES (?)', (new_admin_id,))
-        conn.commit()
-        conn.close()
+        await grant_admin(new_admin_id)
         await update.message.reply_text(f"✅ Admin qo'shildi: {new_admin_id}")
     except ValueError:
         await update.message.reply_text("❌ Noto'g'ri ID formati!")
@@ -385,6 +691,49 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ============================================
 # MANUAL BALL BOSHQARUVI (SUPER ADMIN)
 # ============================================
+def _add_points_bulk(conn, user_ids, points: int, reason: str):
+    conn.execute('BEGIN IMMEDIATE')
+    placeholders = ','.join('?' * len(user_ids))
+    found = [row[0] for row in conn.execute(
+        f'SELECT user_id FROM users WHERE user_id IN ({placeholders})', user_ids
+    )]
+    conn.executemany(ADD_SCORE_SQL, [(user_id, points, points) for user_id in found])
+    conn.executemany(ADD_HISTORY_SQL, [(user_id, points, reason) for user_id in found])
+    return found
+
+
+async def bulk_points_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_super_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Bu komanda faqat super admin uchun!")
+        return
+
+    if len(context.args) < 2:
+        await update.message.reply_text("❌ Foydalanish: /bulkpoints <ball> <user_id> [user_id ...]")
+        return
+
+    try:
+        points = int(context.args[0])
+        user_ids = list(dict.fromkeys(int(arg) for arg in context.args[1:]))
+    except ValueError:
+        await update.message.reply_text("❌ Noto'g'ri format!")
+        return
+
+    found = await db.run(_add_points_bulk, user_ids, points, "Admin tomonidan (guruhli)")
+    for user_id in found:
+        leaderboard.add(user_id, points)
+        outbox.send(
+            user_id,
+            f"🎁 Sizga **{points:+d} ball** berildi!\nSabab: Admin tomonidan",
+            parse_mode='Markdown'
+        )
+
+    missing = len(user_ids) - len(found)
+    text = f"✅ {len(found)} ta foydalanuvchiga {points:+d} ball berildi!"
+    if missing:
+        text += f"\n⚠️ {missing} ta ID topilmadi."
+    await update.message.reply_text(text)
+
+
 async def add_points_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_super_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Bu komanda faqat super admin uchun!")
@@ -398,29 +747,21 @@ async def add_points_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         user_id = int(context.args[0])
         points = int(context.args[1])
 
-        conn = sqlite3.connect('homework.db')
-        cur = conn.cursor()
-        cur.execute('SELECT full_name FROM users WHERE user_id = ?', (user_id,))
-        result = cur.fetchone()
-        conn.close()
+        full_name = await users.get_name(user_id)
 
-        if not result:
+        if full_name is None:
             await update.message.reply_text("❌ Bunday foydalanuvchi topilmadi!")
             return
 
-        full_name = result[0]
         add_score(user_id, points, f"Admin tomonidan qo'shildi")
 
         await update.message.reply_text(f"✅ {full_name} ga +{points} ball qo'shildi!")
 
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🎁 Sizga **+{points} ball** qo'shildi!\nSabab: Admin tomonidan",
-                parse_mode='Markdown'
-            )
-        except:
-            pass
+        outbox.send(
+            user_id,
+            f"🎁 Sizga **+{points} ball** qo'shildi!\nSabab: Admin tomonidan",
+            parse_mode='Markdown'
+        )
     except ValueError:
         await update.message.reply_text("❌ Noto'g'ri format!")
 
@@ -438,29 +779,21 @@ async def remove_points_command(update: Update, context: ContextTypes.DEFAULT_TY
         user_id = int(context.args[0])
         points = int(context.args[1])
 
-        conn = sqlite3.connect('homework.db')
-        cur = conn.cursor()
-        cur.execute('SELECT full_name FROM users WHERE user_id = ?', (user_id,))
-        result = cur.fetchone()
-        conn.close()
+        full_name = await users.get_name(user_id)
 
-        if not result:
+        if full_name is None:
             await update.message.reply_text("❌ Bunday foydalanuvchi topilmadi!")
             return
 
-        full_name = result[0]
         add_score(user_id, -points, f"Admin tomonidan ayirildi")
 
         await update.message.reply_text(f"✅ {full_name} dan -{points} ball ayirildi!")
 
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"⚠️ Sizdan **-{points} ball** ayirildi.",
-                parse_mode='Markdown'
-            )
-        except:
-            pass
+        outbox.send(
+            user_id,
+            f"⚠️ Sizdan **-{points} ball** ayirildi.",
+            parse_mode='Markdown'
+        )
     except ValueError:
         await update.message.reply_text("❌ Noto'g'ri format!")
 
@@ -478,48 +811,24 @@ async def set_points_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         user_id = int(context.args[0])
         points = int(context.args[1])
 
-        conn = sqlite3.connect('homework.db')
-        cur = conn.cursor()
-        cur.execute('SELECT full_name FROM users WHERE user_id = ?', (user_id,))
-        result = cur.fetchone()
+        full_name = await users.get_name(user_id)
 
-        if not result:
+        if full_name is None:
             await update.message.reply_text("❌ Bunday foydalanuvchi topilmadi!")
-            conn.close()
             return
 
-        full_name = result[0]
-
-        cur.execute('SELECT score FROM scores WHERE user_id = ?', (user_id,))
-        old_score = cur.fetchone()
-        old_score = old_score[0] if old_score else 0
-
-        cur.execute('''
-            INSERT INTO scores (user_id, score) VALUES (?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET score = ?
-        ''', (user_id, points, points))
-
-        cur.execute('''
-            INSERT INTO score_history (user_id, points, reason)
-            VALUES (?, ?, ?)
-        ''', (user_id, points - old_score, f"Admin ball o'rnatdi: {old_score} → {points}"))
-
-        conn.commit()
-        conn.close()
+        old_score = set_score(user_id, points)
 
         await update.message.reply_text(
             f"✅ {full_name} ning balli o'rnatildi!\n"
             f"Avvalgi: {old_score} → Yangi: {points}"
         )
 
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"📊 Sizning ballingiz **{points}** ga o'rnatildi.",
-                parse_mode='Markdown'
-            )
-        except:
-            pass
+        outbox.send(
+            user_id,
+            f"📊 Sizning ballingiz **{points}** ga o'rnatildi.",
+            parse_mode='Markdown'
+        )
     except ValueError:
         await update.message.reply_text("❌ Noto'g'ri format!")
 
@@ -527,58 +836,69 @@ async def set_points_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 # ============================================
 # FAYL QABUL QILISH
 # ============================================
-async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_chat.type not in ['group', 'supergroup']:
-        return
+class _SubmissionFilter(filters.MessageFilter):
+    """Caption va fayl nomini bir marta tahlil qiladi; dars raqami context.submission[0] da."""
+
+    def __init__(self, require_hashtag: bool):
+        super().__init__(name='SubmissionFilter', data_filter=True)
+        self.require_hashtag = require_hashtag
+
+    def filter(self, message):
+        has_hashtag, lesson_number = parse_submission(message.caption, message.document.file_name)
+        if self.require_hashtag and not has_hashtag:
+            return None
+        return {'submission': [lesson_number]}
+
+
+class _ReplyToBotFilter(filters.MessageFilter):
+    def filter(self, message):
+        reply = message.reply_to_message
+        return bool(reply and reply.from_user and reply.from_user.id == message.get_bot().id)
+
+
+def submission_filter():
+    """handle_file'ga faqat qabul qilinadigan fayllar yetib keladi (yangi xabar, guruh, .py/.txt, MODE qoidasi)."""
+    # Tahrirlangan xabarlar (edited_message) ham MessageHandler'ga tushadi — ular qabul qilinmaydi
+    accepted = (
+        filters.UpdateType.MESSAGE
+        & filters.ChatType.GROUPS
+        & (filters.Document.FileExtension('py', case_sensitive=True)
+           | filters.Document.FileExtension('txt', case_sensitive=True))
+    )
+    if MODE == "REPLY":
+        accepted &= _ReplyToBotFilter(name='ReplyToBotFilter')
+    # Oxirida: hujjat borligi yuqorida tekshirilgan, HASHTAG rejimida hashtegsizlar rad etiladi
+    return accepted & _SubmissionFilter(require_hashtag=MODE == "HASHTAG")
 
+
+async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Chat turi, kengaytma va MODE qoidasi submission_filter() da tekshirilgan
     user = update.effective_user
     message = update.message
 
-    add_or_update_user(user.id, user.full_name, user.username or "")
-
-    if not message.document:
-        return
-
     file = message.document
     filename = file.file_name
     file_id = file.file_id
 
-    if not (filename.endswith('.py') or filename.endswith('.txt')):
-        return
-
-    caption = message.caption or ""
-
-    if MODE == "HASHTAG":
-        if not has_valid_hashtag(caption):
-            return
-    elif MODE == "REPLY":
-        if not message.reply_to_message or message.reply_to_message.from_user.id != context.bot.id:
-            return
-
-    combined_text = f"{caption} {filename}"
-    lesson_number = extract_lesson_number(combined_text)
+    # submission_filter() caption va fayl nomidan ajratgan dars raqami
+    lesson_number = context.submission[0]
 
     if lesson_number is None:
         await message.reply_text("❌ Dars raqami topilmadi!\nCaption yoki fayl nomida raqam ko'rsating.")
         return
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT id FROM homework 
-        WHERE user_id = ? AND lesson_number = ?
-    ''', (user.id, lesson_number))
-    existing = cur.fetchone()
+    is_new, first, points = await submit_homework(user, lesson_number, file_id, filename)
 
-    if existing:
-        cur.execute('''
-            UPDATE homework 
-            SET file_id = ?, filename = ?, status = 0, comment = NULL, timestamp = CURRENT_TIMESTAMP
-            WHERE user_id = ? AND lesson_number = ?
-        ''', (file_id, filename, user.id, lesson_number))
-        conn.commit()
-        conn.close()
+    if INGEST_ENABLED and (file.file_size or 0) <= INGEST_MAX_BYTES:
+        context.application.create_task(
+            ingest_submission(context.bot, user.id, lesson_number, file_id), update=update
+        )
+    if AUTOGRADE_ENABLED and grader.available and filename.lower().endswith('.py') and grader.cases(lesson_number):
+        context.application.create_task(
+            autograde_submission(context.bot, user.id, lesson_number, file_id), update=update
+        )
 
+    if not is_new:
         await message.reply_text(
             f"━━━━━━━━━━━━━━━\n"
             f"♻️ **{lesson_number}-DARS (Qayta)**\n"
@@ -589,21 +909,10 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
     else:
-        cur.execute('''
-            INSERT INTO homework (user_id, lesson_number, file_id, filename, status)
-            VALUES (?, ?, ?, ?, 0)
-        ''', (user.id, lesson_number, file_id, filename))
-        conn.commit()
-
-        first = is_first_submission(lesson_number)
-        conn.close()
-
         if first:
-            add_score(user.id, 3, f"{lesson_number}-dars (birinchi)")
-            bonus_text = "🌟 Birinchi! **+3 ball**"
+            bonus_text = f"🌟 Birinchi! **+{points} ball**"
         else:
-            add_score(user.id, 1, f"{lesson_number}-dars")
-            bonus_text = "**+1 ball**"
+            bonus_text = f"**+{points} ball**"
 
         await message.reply_text(
             f"━━━━━━━━━━━━━━━\n"
@@ -617,9 +926,215 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+# ============================================
+# TOPSHIRIQLAR OMBORI
+# ============================================
+async def _download(bot, file_id: str) -> bytes:
+    if FILE_CACHE_ENABLED:
+        data = await asyncio.to_thread(file_cache.get, file_id)
+        if data is not None:
+            return data
+
+    async with _download_slots:
+        tg_file = await bot.get_file(file_id)
+        data = bytes(await tg_file.download_as_bytearray())
+
+    if FILE_CACHE_ENABLED:
+        await asyncio.to_thread(file_cache.put, file_id, data)
+    return data
+
+
+async def download_file(bot, file_id: str) -> bytes:
+    """Fayl tarkibi: avval diskdagi keshdan, bo'lmasa Telegram'dan (bir vaqtda bitta yuklash)."""
+    task = _downloads.get(file_id)
+    if task is None:
+        task = _downloads[file_id] = asyncio.ensure_future(_download(bot, file_id))
+        task.add_done_callback(lambda _: _downloads.pop(file_id, None))
+    return await task
+
+
+async def prefetch_files(bot, file_ids):
+    results = await asyncio.gather(*(download_file(bot, file_id) for file_id in file_ids), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logger.info("Prefetch: %d ta fayl yuklanmadi", failed)
+
+
+def load_fingerprints():
+    rows = db.call(lambda conn: conn.execute(
+        'SELECT homework_id, lesson_number, minhash FROM submission_fingerprints'
+    ).fetchall())
+    for homework_id, lesson_number, blob in rows:
+        similarity_index.add(lesson_number, homework_id, unpack_signature(blob))
+
+
+def _fingerprint(data: bytes):
+    content_hash = content_store.put(data)
+    return content_hash, minhash(data.decode('utf-8', errors='replace'))
+
+
+def _save_fingerprint(conn, hw_id: int, file_id: str, lesson_number: int, content_hash: str, signature,
+                      duplicate_of) -> bool:
+    # file_id sharti — yuklab olish paytida qayta topshirilgan bo'lsa eski fayl yozilmaydi
+    updated = conn.execute('UPDATE homework SET content_hash = ?, duplicate_of = ? WHERE id = ? AND file_id = ?',
+                           (content_hash, duplicate_of, hw_id, file_id)).rowcount
+    if not updated:
+        return False
+    conn.execute('''
+        INSERT INTO submission_fingerprints (homework_id, lesson_number, content_hash, minhash)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(homework_id) DO UPDATE SET
+            content_hash = excluded.content_hash,
+            minhash = excluded.minhash
+    ''', (hw_id, lesson_number, content_hash, pack_signature(signature)))
+    return True
+
+
+async def ingest_submission(bot, user_id: int, lesson_number: int, file_id: str):
+    """Faylni yuklab olib xesh bo'yicha saqlaydi va o'xshash topshiriqlarni belgilaydi."""
+    row = await db.fetchone('SELECT id FROM homework WHERE user_id = ? AND lesson_number = ?',
+                            (user_id, lesson_number))
+    if row is None:
+        return
+    hw_id = row[0]
+
+    data = await download_file(bot, file_id)
+    async with _download_slots:
+        # Xeshlash va diskka yozish event loop'dan tashqarida
+        content_hash, signature = await asyncio.to_thread(_fingerprint, data)
+
+    matches = similarity_index.query(lesson_number, signature, exclude=hw_id)
+    duplicate_of = matches[0][0] if matches else None
+    if await db.run(_save_fingerprint, hw_id, file_id, lesson_number, content_hash, signature, duplicate_of):
+        similarity_index.add(lesson_number, hw_id, signature)
+
+
+# ============================================
+# AVTOMATIK TEKSHIRUV
+# ============================================
+async def autograde_submission(bot, user_id: int, lesson_number: int, file_id: str):
+    row = await db.fetchone('SELECT id FROM homework WHERE user_id = ? AND lesson_number = ?',
+                            (user_id, lesson_number))
+    if row is None:
+        return
+    data = await download_file(bot, file_id)
+    if not grader.submit((row[0], file_id), lesson_number, data):
+        logger.info("Autograde: %s-dars topshirig'i navbatga sig'madi", lesson_number)
+
+
+async def save_pregrade(key, passed: int, total: int):
+    hw_id, file_id = key
+    # file_id sharti — tekshiruv paytida qayta topshirilgan bo'lsa eski natija yozilmaydi
+    db_writer.add('''
+        UPDATE homework SET pregrade_passed = ?, pregrade_total = ?
+        WHERE id = ? AND file_id = ?
+    ''', (passed, total, hw_id, file_id))
+
+
 # ============================================
 # TEKSHIRISH
 # ============================================
+STATUS_EMOJI = {0: '⏳', 1: '✅', 2: '✏️'}
+
+
+def _review_page(conn, lesson_number: int, mode: str, anchor_id: int):
+    # Keyset sahifalash: (timestamp, id) bo'yicha, idx_homework_lesson_time indeksi ustida
+    anchor = None
+    if anchor_id:
+        anchor = conn.execute('SELECT timestamp, id FROM homework WHERE id = ?', (anchor_id,)).fetchone()
+
+    query = '''
+        SELECT h.id, u.full_name, h.filename, h.status, h.timestamp, h.duplicate_of, h.file_id,
+               h.pregrade_passed, h.pregrade_total
+        FROM homework h
+        JOIN users u ON h.user_id = u.user_id
+        WHERE h.lesson_number = ?
+    '''
+    if anchor is None:
+        rows = conn.execute(query + ' ORDER BY h.timestamp, h.id LIMIT ?',
+                            (lesson_number, REVIEW_PAGE_SIZE)).fetchall()
+    elif mode == 'p':
+        rows = conn.execute(query + ' AND (h.timestamp, h.id) < (?, ?) ORDER BY h.timestamp DESC, h.id DESC LIMIT ?',
+                            (lesson_number, *anchor, REVIEW_PAGE_SIZE)).fetchall()
+        rows.reverse()
+    else:
+        op = '>' if mode == 'n' else '>='
+        rows = conn.execute(query + f' AND (h.timestamp, h.id) {op} (?, ?) ORDER BY h.timestamp, h.id LIMIT ?',
+                            (lesson_number, *anchor, REVIEW_PAGE_SIZE)).fetchall()
+
+    if not rows:
+        return 0, [], False, False
+
+    total = get_lesson_stats(conn, lesson_number)[0]
+    has_prev = conn.execute('''
+        SELECT EXISTS (SELECT 1 FROM homework WHERE lesson_number = ? AND (timestamp, id) < (?, ?))
+    ''', (lesson_number, rows[0][4], rows[0][0])).fetchone()[0]
+    has_next = conn.execute('''
+        SELECT EXISTS (SELECT 1 FROM homework WHERE lesson_number = ? AND (timestamp, id) > (?, ?))
+    ''', (lesson_number, rows[-1][4], rows[-1][0])).fetchone()[0]
+    return total, rows, has_prev, has_next
+
+
+async def render_review_page(lesson_number: int, mode: str = 'f', anchor_id: int = 0, application=None):
+    """Tekshirish panelining bitta sahifasi: (matn, tugmalar) yoki topshiriq bo'lmasa (None, None).
+
+    mode: 'f' — anchor'dan boshlab, 'n' — anchor'dan keyin, 'p' — anchor'dan oldin.
+    application berilsa, sahifadagi fayllar fonda keshga yuklanadi.
+    """
+    total, rows, has_prev, has_next = await db.run(_review_page, lesson_number, mode, anchor_id)
+    if not rows:
+        return None, None
+
+    if application is not None and FILE_CACHE_ENABLED:
+        application.create_task(prefetch_files(application.bot, [row[6] for row in rows]))
+
+    first_id = rows[0][0]
+    # HTML: ism va fayl nomlaridagi _ * ` [ belgilar butun sahifani buzmasligi uchun
+    text = f"📘 <b>{lesson_number}-dars topshirganlar</b> ({total} ta):\n\n"
+    keyboard = []
+    for idx, (hw_id, full_name, filename, status, _, duplicate_of, _, pg_passed, pg_total) in enumerate(rows, 1):
+        # 🔁 — boshqa topshiriqqa juda o'xshash; 🟢/🔴 — avtomatik testlar natijasi
+        mark = " 🔁" if duplicate_of else ""
+        if pg_total:
+            mark += f" {'🟢' if pg_passed == pg_total else '🔴'} {pg_passed}/{pg_total}"
+        text += (f"{idx}) <b>{html.escape(full_name or '')}</b> {STATUS_EMOJI[status]}{mark}\n"
+                 f"└ <code>{html.escape(filename or '')}</code>\n")
+        keyboard.append([
+            InlineKeyboardButton(f"{idx} 🟦", callback_data=f"view_{hw_id}_{first_id}"),
+            InlineKeyboardButton(f"{idx} 👁", callback_data=f"preview_{hw_id}_{first_id}"),
+            InlineKeyboardButton(f"{idx} ✅", callback_data=f"approve_{hw_id}_{first_id}"),
+            InlineKeyboardButton(f"{idx} ✏️", callback_data=f"reject_{hw_id}_{first_id}")
+        ])
+
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"page_{lesson_number}_p_{first_id}"))
+    if has_next:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"page_{lesson_number}_n_{rows[-1][0]}"))
+    if nav:
+        keyboard.append(nav)
+
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def refresh_review_panel(bot, chat_id: int, message_id: int, lesson_number: int, first_id: int):
+    text, reply_markup = await render_review_page(lesson_number, 'f', first_id)
+    if text is None:
+        return
+    try:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode='HTML'
+        )
+    except BadRequest as e:
+        # "message is not modified" — panel allaqachon dolzarb
+        if 'not modified' not in str(e).lower():
+            raise
+
+
 async def check_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Faqat adminlar uchun!")
@@ -635,91 +1150,65 @@ async def check_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Raqam kiriting! Misol: /check 15")
         return
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT h.id, h.user_id, u.full_name, h.filename, h.status
-        FROM homework h
-        JOIN users u ON h.user_id = u.user_id
-        WHERE h.lesson_number = ?
-        ORDER BY h.timestamp
-    ''', (lesson_number,))
-    submissions = cur.fetchall()
-    conn.close()
+    text, reply_markup = await render_review_page(lesson_number, application=context.application)
 
-    if not submissions:
+    if text is None:
         await update.message.reply_text(f"📭 {lesson_number}-dars uchun topshiriqlar yo'q.")
         return
 
-    # Agar guruhda yozilgan bo'lsa, DM'ga yo'naltirish
+    # Agar guruhda yozilgan bo'lsa, panel DM'ga yuboriladi
     if update.effective_chat.type in ['group', 'supergroup']:
         await update.message.reply_text(
-            f"📋 {lesson_number}-dars uchun {len(submissions)} ta topshiriq bor.\n\n"
-            f"✉️ Tekshirish uchun menga shaxsiy xabar yozing:\n"
+            f"📋 {lesson_number}-dars topshiriqlari shaxsiy xabarda.\n\n"
+            f"✉️ Keyinroq menga shaxsiy xabar yozing:\n"
             f"/check {lesson_number}",
             parse_mode='Markdown'
         )
-        # DMga ham yuboramiz
         try:
-            message = f"📘 **{lesson_number}-dars topshirganlar:**\n\n"
             await context.bot.send_message(
                 chat_id=update.effective_user.id,
-                text=message,
-                parse_mode='Markdown'
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode='HTML'
             )
-        except:
+        except (Forbidden, BadRequest):
             await update.message.reply_text("⚠️ Avval botni ishga tushiring: /start")
-            return
+        return
 
-    # Tekshirish ro'yxati
-    for idx, (hw_id, user_id, full_name, filename, status) in enumerate(submissions, 1):
-        status_emoji = {0: '⏳', 1: '✅', 2: '✏️'}[status]
-
-        keyboard = [
-            [
-                InlineKeyboardButton("🟦 Ko'rish", callback_data=f"view_{hw_id}"),
-                InlineKeyboardButton("✅ Yaxshi", callback_data=f"approve_{hw_id}"),
-                InlineKeyboardButton("✏️ Kamchilik", callback_data=f"reject_{hw_id}")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        try:
-            await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text=f"{idx}) **{full_name}** {status_emoji}\n└ `{filename}`",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        except:
-            await update.message.reply_text("⚠️ Avval botga /start yozing!")
-            return
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    action, hw_id = query.data.split('_')
-    hw_id = int(hw_id)
+    action, *args = query.data.split('_')
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT user_id, lesson_number, file_id, filename
-        FROM homework WHERE id = ?
+    if action == 'page':
+        lesson_number, mode, anchor_id = int(args[0]), args[1], int(args[2])
+        text, reply_markup = await render_review_page(lesson_number, mode, anchor_id, context.application)
+        if text is None:
+            await query.edit_message_text(f"📭 {lesson_number}-dars uchun topshiriqlar yo'q.")
+            return
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        return
+
+    hw_id = int(args[0])
+    # Panel sahifasining birinchi yozuvi (eski xabarlarda yo'q)
+    first_id = int(args[1]) if len(args) > 1 else 0
+
+    result = await db.fetchone('''
+        SELECT h.user_id, h.lesson_number, h.file_id, h.filename, u.full_name
+        FROM homework h
+        JOIN users u ON h.user_id = u.user_id
+        WHERE h.id = ?
     ''', (hw_id,))
-    result = cur.fetchone()
 
     if not result:
         await query.edit_message_text("❌ Topilmadi!")
-        conn.close()
         return
 
-    user_id, lesson_number, file_id, filename = result
-    cur.execute('SELECT full_name FROM users WHERE user_id = ?', (user_id,))
-    full_name = cur.fetchone()[0]
-    conn.close()
+    user_id, lesson_number, file_id, filename, full_name = result
 
     if action == 'view':
         await context.bot.send_document(
@@ -728,36 +1217,55 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             caption=f"📄 {full_name} — {lesson_number}-dars\n`{filename}`",
             parse_mode='Markdown'
         )
-        await query.edit_message_text(f"✅ Yuborildi: `{filename}`", parse_mode='Markdown')
+        if not first_id:
+            await query.edit_message_text(f"✅ Yuborildi: `{filename}`", parse_mode='Markdown')
+
+    elif action == 'preview':
+        try:
+            data = await download_file(context.bot, file_id)
+        except BadRequest:
+            await context.bot.send_message(chat_id=query.from_user.id, text="⚠️ Faylni yuklab bo'lmadi, 🟦 orqali oching.")
+            return
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        body = '\n'.join(lines[:PREVIEW_LINES])
+        if len(lines) > PREVIEW_LINES:
+            body += f"\n# ... yana {len(lines) - PREVIEW_LINES} qator"
+
+        header = f"📄 {html.escape(full_name)} — {lesson_number}-dars\n<code>{html.escape(filename)}</code>\n"
+        code = html.escape(body)[:MAX_MESSAGE_LENGTH - len(header) - 64]
+        if code.rfind('&') > code.rfind(';'):
+            # Kesishda yarim qolgan &...; entity tashlanadi
+            code = code[:code.rfind('&')]
+        await context.bot.send_message(
+            chat_id=query.from_user.id,
+            text=f"{header}<pre><code class=\"language-python\">{code}</code></pre>",
+            parse_mode='HTML'
+        )
 
     elif action == 'approve':
-        conn = sqlite3.connect('homework.db')
-        cur = conn.cursor()
-        cur.execute('UPDATE homework SET status = 1 WHERE id = ?', (hw_id,))
-        conn.commit()
-        conn.close()
+        old_status = await db.run(_set_homework_status, hw_id, 1)
 
-        add_score(user_id, 1, f"{lesson_number}-dars yaxshi bajarildi")
+        # Ikki marta bosilganda bonus va xabarlar takrorlanmaydi
+        if old_status != 1:
+            add_score(user_id, 1, f"{lesson_number}-dars yaxshi bajarildi")
 
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🏅 **{lesson_number}-dars** yaxshi bajarildi! +1 bonus",
+            outbox.send(
+                user_id,
+                f"🏅 **{lesson_number}-dars** yaxshi bajarildi! +1 bonus",
                 parse_mode='Markdown'
             )
-        except:
-            pass
 
-        try:
-            await context.bot.send_message(
-                chat_id=GROUP_CHAT_ID,
-                text=f"✅ **{full_name}** — {lesson_number}-dars yaxshi ✓",
+            outbox.send(
+                GROUP_CHAT_ID,
+                f"✅ **{full_name}** — {lesson_number}-dars yaxshi ✓",
                 parse_mode='Markdown'
             )
-        except:
-            pass
 
-        await query.edit_message_text(f"✅ {full_name} — Yaxshi!")
+        if first_id:
+            await refresh_review_panel(context.bot, query.message.chat_id, query.message.message_id,
+                                       lesson_number, first_id)
+        else:
+            await query.edit_message_text(f"✅ {full_name} — Yaxshi!")
 
     elif action == 'reject':
         context.user_data['pending_feedback'] = {
@@ -766,11 +1274,19 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'lesson_number': lesson_number,
             'full_name': full_name
         }
-        await query.edit_message_text(
+        prompt = (
             f"✏️ **{full_name}** — {lesson_number}-dars\n\n"
-            f"Kamchilikni yozing (/cancel bekor):",
-            parse_mode='Markdown'
+            f"Kamchilikni yozing (/cancel bekor):"
         )
+        if first_id:
+            # Panel joyida qoladi, feedback'dan keyin yangilanadi
+            context.user_data['pending_feedback']['panel'] = (
+                query.message.chat_id, query.message.message_id, first_id
+            )
+            await query.message.reply_text(prompt, parse_mode='Markdown')
+        else:
+            await query.edit_message_text(prompt, parse_mode='Markdown')
+        return WAITING_FOR_FEEDBACK
 
 
 async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -780,38 +1296,29 @@ async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     feedback = update.message.text
     data = context.user_data['pending_feedback']
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
-    cur.execute('''
-        UPDATE homework 
-        SET status = 2, comment = ?
-        WHERE id = ?
-    ''', (feedback, data['hw_id']))
-    conn.commit()
-    conn.close()
+    await db.run(_set_homework_status, data['hw_id'], 2, feedback)
 
-    try:
-        await context.bot.send_message(
-            chat_id=data['user_id'],
-            text=f"✏️ **{data['lesson_number']}-dars** kamchiliklar:\n\n"
-                 f"{feedback}\n\n"
-                 f"Tuzatib qayta topshiring 🙂",
-            parse_mode='Markdown'
-        )
-    except:
-        pass
+    outbox.send(
+        data['user_id'],
+        f"✏️ **{data['lesson_number']}-dars** kamchiliklar:\n\n"
+        f"{feedback}\n\n"
+        f"Tuzatib qayta topshiring 🙂",
+        parse_mode='Markdown'
+    )
 
-    try:
-        await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
-            text=f"⚠️ **{data['full_name']}** — {data['lesson_number']}-dars biroz kamchilik\n"
-                 f"(izoh shaxsiy xabarda)",
-            parse_mode='Markdown'
-        )
-    except:
-        pass
+    outbox.send(
+        GROUP_CHAT_ID,
+        f"⚠️ **{data['full_name']}** — {data['lesson_number']}-dars biroz kamchilik\n"
+        f"(izoh shaxsiy xabarda)",
+        parse_mode='Markdown'
+    )
 
     await update.message.reply_text("✅ Kamchilik yuborildi!")
+
+    if data.get('panel'):
+        chat_id, message_id, first_id = data['panel']
+        await refresh_review_panel(context.bot, chat_id, message_id, data['lesson_number'], first_id)
+
     del context.user_data['pending_feedback']
     return ConversationHandler.END
 
@@ -823,13 +1330,55 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-async def not_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# /notdone natijalari: dars -> [(user_id, full_name)].
+# Topshiriq kelganda shu dars, foydalanuvchi yoki admin o'zgarganda hammasi tozalanadi.
+_not_done_cache = {}
+
+
+async def get_not_done(lesson_number: int):
+    rows = _not_done_cache.get(lesson_number)
+    if rows is None:
+        rows = await db.fetchall('''
+            SELECT u.user_id, u.full_name
+            FROM users u
+            WHERE NOT EXISTS (SELECT 1 FROM homework h WHERE h.user_id = u.user_id AND h.lesson_number = ?)
+              AND NOT EXISTS (SELECT 1 FROM admins a WHERE a.user_id = u.user_id)
+            ORDER BY u.user_id
+        ''', (lesson_number,))
+        _not_done_cache[lesson_number] = rows
+    return rows
+
+
+def _approve_all(conn, lesson_number: int):
+    conn.execute('BEGIN IMMEDIATE')
+    pending = conn.execute('''
+        SELECT h.id, h.user_id, u.full_name
+        FROM homework h
+        JOIN users u ON h.user_id = u.user_id
+        WHERE h.lesson_number = ? AND h.status = 0
+    ''', (lesson_number,)).fetchall()
+    if not pending:
+        return []
+
+    conn.executemany('UPDATE homework SET status = 1 WHERE id = ?', [(hw_id,) for hw_id, _, _ in pending])
+    conn.execute('''
+        UPDATE lesson_stats SET pending = pending - ?, approved = approved + ?
+        WHERE lesson_number = ?
+    ''', (len(pending), len(pending), lesson_number))
+
+    reason = f"{lesson_number}-dars yaxshi bajarildi"
+    conn.executemany(ADD_SCORE_SQL, [(user_id, 1, 1) for _, user_id, _ in pending])
+    conn.executemany(ADD_HISTORY_SQL, [(user_id, 1, reason) for _, user_id, _ in pending])
+    return [(user_id, full_name) for _, user_id, full_name in pending]
+
+
+async def approve_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Faqat adminlar uchun!")
         return
 
     if not context.args:
-        await update.message.reply_text("❌ /notdone <dars_raqami>")
+        await update.message.reply_text("❌ /approveall <dars_raqami>")
         return
 
     try:
@@ -838,36 +1387,302 @@ async def not_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Raqam kiriting!")
         return
 
-    conn = sqlite3.connect('homework.db')
-    cur = conn.cursor()
+    approved = await db.run(_approve_all, lesson_number)
+
+    if not approved:
+        await update.message.reply_text(f"📭 {lesson_number}-darsda tekshirilmagan topshiriq yo'q.")
+        return
+
+    for user_id, _ in approved:
+        leaderboard.add(user_id, 1)
+        outbox.send(
+            user_id,
+            f"🏅 **{lesson_number}-dars** yaxshi bajarildi! +1 bonus",
+            parse_mode='Markdown'
+        )
+
+    # Guruhga bitta umumiy xabar
+    header = f"✅ **{lesson_number}-dars** yaxshi bajarildi:\n\n"
+    for chunk in split_message(header, [f"— {name}" for _, name in approved]):
+        outbox.send(GROUP_CHAT_ID, chunk, parse_mode='Markdown')
+
+    await update.message.reply_text(f"✅ {lesson_number}-dars: {len(approved)} ta topshiriq tasdiqlandi!")
+
+
+async def lesson_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Faqat adminlar uchun!")
+        return
 
-    cur.execute('SELECT user_id, full_name FROM users')
-    all_users = cur.fetchall()
+    if not context.args:
+        await update.message.reply_text("❌ /stats <dars_raqami>")
+        return
 
-    cur.execute('SELECT user_id FROM homework WHERE lesson_number = ?', (lesson_number,))
-    submitted = {row[0] for row in cur.fetchall()}
-    conn.close()
+    try:
+        lesson_number = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ Raqam kiriting!")
+        return
+
+    submitted, pending, approved, needs_fix = await db.run(get_lesson_stats, lesson_number)
+
+    await update.message.reply_text(
+        f"📊 **{lesson_number}-dars statistikasi:**\n\n"
+        f"📥 Topshirilgan: {submitted}\n"
+        f"⏳ Tekshirilmoqda: {pending}\n"
+        f"✅ Yaxshi: {approved}\n"
+        f"✏️ Kamchilik: {needs_fix}",
+        parse_mode='Markdown'
+    )
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Faqat adminlar uchun!")
+        return
+
+    fmt = context.args[0].lower() if context.args else 'csv'
+    if fmt not in FORMATS:
+        await update.message.reply_text(f"❌ Foydalanish: /export [{'|'.join(FORMATS)}]")
+        return
+
+    # Navbatdagi ballar ham eksportga tushishi uchun
+    await db_writer.flush()
+
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}.gz')
+    os.close(fd)
+    try:
+        count = await db.run(export_gradebook, path, fmt)
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=f"gradebook_{datetime.now():%Y%m%d}.{fmt}.gz",
+                caption=f"📦 Baholar jadvali: {count} ta qator"
+            )
+    finally:
+        os.remove(path)
+
+
+async def not_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Faqat adminlar uchun!")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ /notdone <dars_raqami>")
+        return
+
+    try:
+        lesson_number = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ Raqam kiriting!")
+        return
 
-    not_submitted = [(uid, name) for uid, name in all_users if uid not in submitted and not is_admin(uid)]
+    not_submitted = await get_not_done(lesson_number)
 
     if not not_submitted:
         await update.message.reply_text(f"✅ {lesson_number}-darsni hammalar topshirgan!")
         return
 
-    message = f"📌 **{lesson_number}-darsni topshirmaganlar:**\n\n"
-    for _, name in not_submitted:
-        message += f"— {name}\n"
+    header = f"📌 **{lesson_number}-darsni topshirmaganlar:**\n\n"
+    for chunk in split_message(header, [f"— {name}" for _, name in not_submitted]):
+        await update.message.reply_text(chunk, parse_mode='Markdown')
+
+
+# ============================================
+# METRIKALAR
+# ============================================
+def _latency_lines(name: str, label: str):
+    lines = []
+    for labels, histogram in REGISTRY.histograms(name):
+        lines.append(
+            f"{labels.get(label, '-'):<18} {histogram.count:>6} "
+            f"{histogram.quantile(0.5) * 1000:>8.1f} {histogram.quantile(0.99) * 1000:>8.1f}"
+        )
+    return lines
 
-    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Faqat adminlar uchun!")
+        return
+
+    header = f"{'':<18} {'soni':>6} {'p50 ms':>8} {'p99 ms':>8}"
+    lines = ["HANDLERLAR", header, *_latency_lines('handler_seconds', 'handler')]
+    errors = [
+        f"{labels['handler']}: {int(REGISTRY.counter('handler_errors_total', **labels))}"
+        for labels, _ in REGISTRY.histograms('handler_seconds')
+        if REGISTRY.counter('handler_errors_total', **labels)
+    ]
+    if errors:
+        lines += ["xatolar: " + ", ".join(errors)]
+    lines += ["", "SQLITE", header, *_latency_lines('db_seconds', 'op')]
+    lines += ["", "TELEGRAM API", header, *_latency_lines('telegram_seconds', 'method')]
+    lines += [""]
+    for component, key, value in REGISTRY.gauges():
+        if isinstance(value, float):
+            value = f"{value:.4f}"
+        lines.append(f"{component}.{key} = {value}")
+
+    # Har bir bo'lak alohida <pre> blokda
+    for chunk in split_message("", [html.escape(line) for line in lines], MAX_MESSAGE_LENGTH - 16):
+        await update.message.reply_text(f"<pre>{chunk}</pre>", parse_mode='HTML')
+
+
+def instrument_handlers(app: Application):
+    """Ro'yxatdan o'tgan barcha handler callback'larini vaqt o'lchovi bilan o'rash."""
+    def wrap(handler):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                wrap(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    wrap(inner)
+        else:
+            handler.callback = instrument(handler.callback)
+
+    for group in app.handlers.values():
+        for handler in group:
+            wrap(handler)
 
 
 # ============================================
-# MAIN
+# PARALLEL ISHLASH
 # ============================================
-def main():
-    init_db()
+class BoundedUpdateQueue(asyncio.Queue):
+    """Application.update_queue, ishlanayotgan update'lar soni bilan cheklangan.
+
+    PTB concurrent rejimda har bir update'ni navbatdan darhol olib task
+    yaratadi, shuning uchun maxsize o'zi task'lar sonini cheklamaydi.
+    Bu yerda get() olingan, lekin task_done() qilinmagan update'lar
+    max_in_flight ga yetganda kutadi — ortiqcha update navbatda qoladi.
+    """
+
+    def __init__(self, maxsize: int, max_in_flight: int):
+        super().__init__(maxsize)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._released = asyncio.Event()
+
+    async def get(self):
+        while self.in_flight >= self.max_in_flight:
+            self._released.clear()
+            await self._released.wait()
+        item = await super().get()
+        self.in_flight += 1
+        return item
+
+    def task_done(self):
+        super().task_done()
+        # To'xtashda PTB get_nowait() bilan tashlangan update'lar uchun ham chaqiradi
+        self.in_flight = max(0, self.in_flight - 1)
+        self._released.set()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Update'larni parallel ishlaydi, lekin bitta (user, chat) uchun ketma-ket.
+
+    Shu tufayli feedback suhbati va qayta topshirishlar tartibi buzilmaydi.
+    Umumiy slot (max_concurrent_updates) faqat o'z (user, chat) qulfini olgan
+    update'ga beriladi — bitta foydalanuvchining navbati boshqalarni to'sib qo'ymaydi.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._active = 0
+        self._locks = {}  # (user_id, chat_id) -> [Lock, kutayotganlar soni]
+
+    @staticmethod
+    def _key(update):
+        if not isinstance(update, Update):
+            return None
+        user = update.effective_user
+        chat = update.effective_chat
+        return (user.id if user else None, chat.id if chat else None)
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        return self._active
+
+    async def process_update(self, update, coroutine):
+        # Bazaviy process_update slotni qulfdan oldin oladi; bu yerda tartib teskari
+        key = self._key(update)
+        if key is None:
+            await self._run(update, coroutine)
+            return
 
-    app = Application.builder().token(BOT_TOKEN).build()
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def _run(self, update, coroutine):
+        async with self._slots:
+            self._active += 1
+            try:
+                await self.do_process_update(update, coroutine)
+            finally:
+                self._active -= 1
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+# ============================================
+# MAIN
+# ============================================
+async def on_startup(app: Application):
+    global _metrics_server
+    db_writer.start()
+    if METRICS_PORT:
+        _metrics_server = await serve_metrics(METRICS_HOST, METRICS_PORT)
+    outbox.start(app.bot)
+    if AUTOGRADE_ENABLED:
+        grader.start(save_pregrade)
+
+
+async def on_shutdown(app: Application):
+    await outbox.close()
+    await grader.close()
+    await db_writer.close()
+    db.close()
+    if _metrics_server is not None:
+        _metrics_server.close()
+        await _metrics_server.wait_closed()
+
+
+def build_application(request=None) -> Application:
+    """Barcha handler'lari ro'yxatdan o'tgan Application.
+
+    request — Bot API transporti (berilsa getUpdates ham shu orqali ketadi).
+    """
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request or TimedRequest())
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .persistence(SQLitePersistence(db, db_writer))
+        .update_queue(BoundedUpdateQueue(UPDATE_QUEUE_SIZE, UPDATE_IN_FLIGHT_LIMIT))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.get_updates_request(request)
+    app = builder.build()
 
     # Komandalar
     app.add_handler(CommandHandler('start', start))
@@ -879,12 +1694,17 @@ def main():
     app.add_handler(CommandHandler('topmonth', top_month))
     app.add_handler(CommandHandler('check', check_homework))
     app.add_handler(CommandHandler('notdone', not_done))
+    app.add_handler(CommandHandler('stats', lesson_stats))
+    app.add_handler(CommandHandler('approveall', approve_all))
+    app.add_handler(CommandHandler('export', export_command))
+    app.add_handler(CommandHandler('metrics', metrics_command))
     app.add_handler(CommandHandler('addadmin', add_admin))
 
     # Super admin komandalar
     app.add_handler(CommandHandler('addpoints', add_points_command))
     app.add_handler(CommandHandler('removepoints', remove_points_command))
     app.add_handler(CommandHandler('setpoints', set_points_command))
+    app.add_handler(CommandHandler('bulkpoints', bulk_points_command))
 
     # Conversation
     conv_handler = ConversationHandler(
@@ -893,6 +1713,8 @@ def main():
             WAITING_FOR_FEEDBACK: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_feedback)]
         },
         fallbacks=[CommandHandler('cancel', cancel)],
+        name='feedback',
+        persistent=True,
         per_message=False,
         per_chat=True,
         per_user=True
@@ -900,15 +1722,61 @@ def main():
     app.add_handler(conv_handler)
 
     # Fayl qabul qilish
-    app.add_handler(MessageHandler(filters.Document.ALL, handle_file))
+    app.add_handler(MessageHandler(submission_filter(), handle_file))
     app.add_handler(CallbackQueryHandler(button_handler))
 
+    # Har bir handler kechikishi va xatolari /metrics uchun yoziladi
+    instrument_handlers(app)
+    return app
+
+
+def main():
+    # Izolyatsiyasiz talaba kodi bot fayllari (BOT_TOKEN, homework.db) va tarmoqqa yetadi
+    if AUTOGRADE_ENABLED and grader.unavailable_reason():
+        sys.exit(f"❌ AUTOGRADE_ENABLED: {grader.unavailable_reason()}")
+
+    if RUN_MODE == "WEBHOOK":
+        # Sirsiz webhook'ga URL'ni topgan har kim soxta update (masalan /setpoints) yubora oladi
+        if not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', WEBHOOK_SECRET):
+            sys.exit("❌ WEBHOOK rejimi uchun WEBHOOK_SECRET kerak (1-256 ta A-Z, a-z, 0-9, _ yoki -)")
+        if not WEBHOOK_URL.startswith('https://'):
+            sys.exit("❌ WEBHOOK rejimi uchun WEBHOOK_URL kerak, masalan https://bot.example.com")
+
+    init_db()
+    app = build_application()
+
     print("🤖 Bot ishga tushdi!")
     print(f"📋 Rejim: {MODE}")
     print(f"👨‍💼 Super Admin: {SUPER_ADMIN}")
-    app.run_polling()
+
+    if RUN_MODE == "WEBHOOK":
+        print(f"🌐 Webhook: {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+        )
+    else:
+        app.run_polling()
+
+
+def export_main(argv):
+    parser = argparse.ArgumentParser(prog='bot.py export', description="Baholar jadvalini faylga eksport qilish")
+    parser.add_argument('output', help="Natija fayli (gzip), masalan gradebook.csv.gz")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    args = parser.parse_args(argv)
+
+    init_db()
+    count = db.call(export_gradebook, args.output, args.format)
+    db.close()
+    print(f"📦 {count} ta qator yozildi: {args.output}")
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        export_main(sys.argv[2:])
+    else:
+        main()
 
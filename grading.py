@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows — cheklovlarsiz ishga tushirilmaydi
+    resource = None
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+CASES_DIR = 'grading'  # grading/<dars>.json: [{"input": "...", "output": "..."}, ...]
+WORKERS = os.cpu_count() or 2
+QUEUE_SIZE = 100
+TIME_LIMIT = 2  # soniya — bitta test uchun (CPU va devor soati)
+MEMORY_LIMIT = 256 * 1024 * 1024
+OUTPUT_LIMIT = 64 * 1024
+
+# Izolyatsiya: bubblewrap (https://github.com/containers/bubblewrap) — alohida user,
+# net, pid, ipc va mount namespace. Ichida faqat Python va tizim kutubxonalari
+# (faqat o'qish uchun) hamda yechim papkasi ko'rinadi; bot papkasi, homework.db
+# va tarmoq yo'q. bwrap topilmasa avtomatik tekshiruv ishlamaydi.
+BWRAP = shutil.which('bwrap')
+SANDBOX_UID = 65534  # nobody
+SANDBOX_DIR = '/sandbox'
+
+logger = logging.getLogger(__name__)
+
+# Bola jarayonda: cheklovlarni o'rnatib, yechimni __main__ sifatida ishga tushiradi.
+# Soft va hard bir xil — yechim cheklovni o'zi ko'tara olmaydi.
+_LAUNCHER = '''
+import resource, runpy, sys
+cpu, memory, output = map(int, sys.argv[1:4])
+for limit, value in ((resource.RLIMIT_CPU, cpu), (resource.RLIMIT_AS, memory),
+                     (resource.RLIMIT_FSIZE, output), (resource.RLIMIT_CORE, 0)):
+    resource.setrlimit(limit, (value, value))
+if hasattr(resource, 'RLIMIT_NPROC'):
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+sys.argv = ['main.py']
+runpy.run_path('main.py', run_name='__main__')
+'''
+
+
+def _sandbox_args(workdir: str):
+    args = [
+        BWRAP, '--unshare-all', '--die-with-parent', '--new-session',
+        '--uid', str(SANDBOX_UID), '--gid', str(SANDBOX_UID),
+        '--ro-bind', '/usr', '/usr',
+    ]
+    for path in ('/bin', '/lib', '/lib64', '/lib32'):
+        args += ['--ro-bind-try', path, path]
+    # Python /usr tashqarisida o'rnatilgan bo'lishi mumkin (pyenv, venv)
+    for prefix in {os.path.realpath(sys.base_prefix), os.path.realpath(sys.prefix)}:
+        if not prefix.startswith('/usr/'):
+            args += ['--ro-bind', prefix, prefix]
+    args += [
+        '--proc', '/proc', '--dev', '/dev', '--tmpfs', '/tmp',
+        '--ro-bind', workdir, SANDBOX_DIR, '--chdir', SANDBOX_DIR,
+        '--',
+    ]
+    return args
+
+
+def _normalize(text: str) -> str:
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+
+# ============================================
+# AVTOMATIK TEKSHIRUV
+# ============================================
+class Grader:
+    """.py topshiriqlarni grading/<dars>.json testlari bilan alohida jarayonlarda tekshiradi.
+
+    Vazifalar chegaralangan navbatga tushadi; WORKERS ta ishchi ularni
+    parallel bajaradi. Har bir test bwrap ichida (alohida namespace'lar,
+    nobody uid, tarmoqsiz, faqat o'qiladigan tizim fayllari) -I rejimidagi
+    yangi interpreterda, bo'sh muhit va rlimit'lar bilan ishga tushadi.
+    Natija (o'tgan, jami) on_result(key, passed, total) ga beriladi.
+    """
+
+    def __init__(self, cases_dir: str = CASES_DIR, workers: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self.cases_dir = cases_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self._cases = {}  # dars -> (mtime, testlar)
+        self._queue = None
+        self._tasks = []
+        self._on_result = None
+
+        # Metrikalar
+        self.graded = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @staticmethod
+    def unavailable_reason():
+        """Tekshiruvni xavfsiz ishga tushirib bo'lmasa sababi, aks holda None."""
+        if resource is None:
+            return "resource moduli yo'q (faqat Unix)"
+        if BWRAP is None:
+            return "bwrap (bubblewrap) topilmadi"
+        if os.geteuid() == 0:
+            return "bot root sifatida ishlamoqda"
+        return None
+
+    @property
+    def available(self) -> bool:
+        return self.unavailable_reason() is None
+
+    def cases(self, lesson_number: int):
+        """Dars testlari (fayl o'zgarsa qayta o'qiladi); testlar bo'lmasa bo'sh ro'yxat."""
+        path = os.path.join(self.cases_dir, f'{lesson_number}.json')
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return []
+        cached = self._cases.get(lesson_number)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding='utf-8') as f:
+                cached = self._cases[lesson_number] = (mtime, json.load(f))
+        return cached[1]
+
+    def start(self, on_result):
+        self._on_result = on_result
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, key, lesson_number: int, source: bytes) -> bool:
+        """Navbatga qo'yadi; navbat to'lgan yoki testlar yo'q bo'lsa False."""
+        if self._queue is None or not self.available or not self.cases(lesson_number):
+            return False
+        try:
+            self._queue.put_nowait((key, lesson_number, source))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    async def _worker(self):
+        while True:
+            key, lesson_number, source = await self._queue.get()
+            try:
+                passed, total = await self.grade(lesson_number, source)
+                self.graded += 1
+                await self._on_result(key, passed, total)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception("Grader: %s tekshirilmadi", key)
+
+    # ---------- ishga tushirish ----------
+    async def grade(self, lesson_number: int, source: bytes):
+        cases = self.cases(lesson_number)
+        workdir = tempfile.mkdtemp(prefix='grade-')
+        try:
+            with open(os.path.join(workdir, 'main.py'), 'wb') as f:
+                f.write(source)
+            passed = 0
+            for case in cases:
+                output = await self._run(workdir, case.get('input', ''))
+                if output is not None and _normalize(output) == _normalize(case['output']):
+                    passed += 1
+            return passed, len(cases)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def _run(self, workdir: str, stdin: str):
+        """Bitta test: stdout matni yoki xato/limit oshganda None."""
+        proc = await asyncio.create_subprocess_exec(
+            *_sandbox_args(workdir),
+            sys.executable, '-I', '-c', _LAUNCHER, str(TIME_LIMIT), str(MEMORY_LIMIT), str(OUTPUT_LIMIT),
+            cwd=workdir,
+            env={'PYTHONIOENCODING': 'utf-8', 'PYTHONDONTWRITEBYTECODE': '1'},
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            # sleep() CPU sarflamaydi — devor soati bo'yicha ham chegaralanadi
+            stdout = await asyncio.wait_for(self._communicate(proc, stdin.encode()), TIME_LIMIT * 2)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if proc.returncode is None:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+        if proc.returncode != 0 or len(stdout) > OUTPUT_LIMIT:
+            return None
+        return stdout.decode('utf-8', errors='replace')
+
+    @staticmethod
+    async def _communicate(proc, stdin: bytes) -> bytes:
+        # communicate() butun chiqishni xotiraga yig'adi — bu yerda OUTPUT_LIMIT'dan keyin to'xtaydi
+        try:
+            proc.stdin.write(stdin)
+            await proc.stdin.drain()
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        stdout = bytearray()
+        while len(stdout) <= OUTPUT_LIMIT:
+            chunk = await proc.stdout.read(64 * 1024)
+            if not chunk:
+                await proc.wait()
+                break
+            stdout += chunk
+        return bytes(stdout)
+
+    def metrics(self) -> dict:
+        return {
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'graded': self.graded,
+            'rejected': self.rejected,
+            'failed': self.failed,
+        }
@@ -0,0 +1,147 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+BUCKET_SECONDS = 24 * 60 * 60  # kunlik bo'laklar
+WINDOWS = {'week': 7, 'month': 30}  # oyna nomi -> bo'laklar soni
+
+
+def bucket_of(when: datetime) -> int:
+    # score_history.timestamp CURRENT_TIMESTAMP (UTC) bilan yoziladi
+    return int((when - datetime(1970, 1, 1)).total_seconds() // BUCKET_SECONDS)
+
+
+# ============================================
+# REYTING
+# ============================================
+class Leaderboard:
+    """Xotirada saqlanadigan umumiy va davriy reytinglar.
+
+    Umumiy ball har bir o'zgarishda yangilanadi va (-ball, user_id) bo'yicha
+    saralangan ro'yxatda ham saqlanadi — o'rin va qo'shnilar bisect bilan
+    topiladi. Haftalik/oylik reyting kunlik bo'laklardagi yig'indilardan
+    iborat: yangi kun boshlanganda oynadan chiqqan bo'lak yig'indidan ayiriladi.
+    """
+
+    def __init__(self, windows=None):
+        self.windows = dict(windows or WINDOWS)
+        self.totals = {}
+        self.names = {}
+        self._ranked = []  # [(-ball, user_id)] o'sish tartibida
+        self._buckets = {}  # bo'lak -> {user_id: ball}
+        self._rolling = {name: defaultdict(int) for name in self.windows}
+        self._current = None
+
+    # ---------- yuklash ----------
+    def load(self, names, scores, history, now: datetime = None):
+        """Bazadan qayta qurish: names/scores — (user_id, qiymat), history — (user_id, ball, timestamp)."""
+        self.names = dict(names)
+        self.totals = dict(scores)
+        self._ranked = sorted((-score, user_id) for user_id, score in self.totals.items())
+        self._buckets.clear()
+        for rolling in self._rolling.values():
+            rolling.clear()
+        self._current = bucket_of(now or datetime.utcnow())
+        for user_id, points, timestamp in history:
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            self._add_history(user_id, points, bucket_of(timestamp))
+
+    # ---------- yangilash ----------
+    def set_name(self, user_id: int, full_name: str):
+        self.names[user_id] = full_name
+
+    def add(self, user_id: int, points: int, when: datetime = None):
+        self._set_score(user_id, self.totals.get(user_id, 0) + points)
+        self._add_history(user_id, points, self._advance(when))
+
+    def set_total(self, user_id: int, score: int, when: datetime = None):
+        delta = score - self.totals.get(user_id, 0)
+        self._set_score(user_id, score)
+        self._add_history(user_id, delta, self._advance(when))
+
+    def _set_score(self, user_id: int, score: int):
+        old = self.totals.get(user_id)
+        if old is not None:
+            del self._ranked[bisect_left(self._ranked, (-old, user_id))]
+        self.totals[user_id] = score
+        insort(self._ranked, (-score, user_id))
+
+    def _add_history(self, user_id: int, points: int, bucket: int):
+        if self._current is None:
+            self._current = bucket
+        bucket_points = self._buckets.setdefault(bucket, defaultdict(int))
+        bucket_points[user_id] += points
+        for name, size in self.windows.items():
+            if bucket > self._current - size:
+                self._rolling[name][user_id] += points
+
+    def _advance(self, when: datetime = None) -> int:
+        bucket = bucket_of(when or datetime.utcnow())
+        if self._current is None:
+            self._current = bucket
+        if bucket <= self._current:
+            return bucket
+
+        # Oynadan chiqqan bo'laklarni yig'indilardan ayirish
+        for name, size in self.windows.items():
+            rolling = self._rolling[name]
+            for old in range(self._current - size + 1, bucket - size + 1):
+                for user_id, points in self._buckets.get(old, {}).items():
+                    rolling[user_id] -= points
+                    if rolling[user_id] == 0:
+                        del rolling[user_id]
+
+        oldest = bucket - max(self.windows.values())
+        for old in [b for b in self._buckets if b <= oldest]:
+            del self._buckets[old]
+        self._current = bucket
+        return bucket
+
+    # ---------- o'qish ----------
+    def _top(self, values, limit: int):
+        ranked = ((user_id, score) for user_id, score in values.items() if user_id in self.names)
+        best = heapq.nlargest(limit, ranked, key=lambda item: item[1])
+        return [(self.names[user_id], score) for user_id, score in best]
+
+    def top(self, limit: int = 10):
+        result = []
+        for neg_score, user_id in self._ranked:
+            if len(result) == limit or neg_score >= 0:
+                break
+            if user_id in self.names:
+                result.append((self.names[user_id], -neg_score))
+        return result
+
+    def _rank_of_score(self, score: int) -> int:
+        # Teng balllilar bir xil o'rinni oladi
+        return bisect_left(self._ranked, (-score, float('-inf'))) + 1
+
+    def rank(self, user_id: int):
+        """(o'rin, jami, foiz) — foiz: foydalanuvchi eng yaxshi necha foizda; ballsiz bo'lsa None."""
+        score = self.totals.get(user_id)
+        if score is None:
+            return None
+        position = self._rank_of_score(score)
+        total = len(self._ranked)
+        return position, total, 100 * position / total
+
+    def neighbours(self, user_id: int, around: int = 2):
+        """Foydalanuvchi atrofidagi [(o'rin, ism, ball, o'zimi)] ro'yxati."""
+        score = self.totals.get(user_id)
+        if score is None:
+            return []
+        index = bisect_left(self._ranked, (-score, user_id))
+        window = self._ranked[max(0, index - around):index + around + 1]
+        return [
+            (self._rank_of_score(-neg_score), self.names.get(other_id, str(other_id)), -neg_score, other_id == user_id)
+            for neg_score, other_id in window
+        ]
+
+    def top_window(self, name: str, limit: int = 10, now: datetime = None):
+        self._advance(now)
+        return self._top(self._rolling[name], limit)
@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from telegram.request import HTTPXRequest
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+PREFIX = 'homework_bot'
+# Histogram chegaralari (soniya)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# HISTOGRAM
+# ============================================
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # oxirgisi — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Bucket ichida chiziqli interpolatsiya bilan taxminiy kvantil."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= target and n:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                lower = BUCKETS[i - 1] if i else 0.0
+                return lower + (BUCKETS[i] - lower) * (target - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+def _labels(*pairs) -> str:
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + body + '}'
+
+
+# ============================================
+# REESTR
+# ============================================
+class Metrics:
+    """Jarayon ichidagi counter va histogram'lar reestri.
+
+    observe()/inc() DB executor thread'laridan ham chaqiriladi, shuning uchun
+    lock ostida. register() bilan qo'shilgan komponentlarning metrics()
+    lug'atlari gauge sifatida chiqariladi.
+    """
+
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self._histograms = {}  # (nom, ((label, qiymat), ...)) -> Histogram
+        self._counters = {}
+        self._collectors = {}  # komponent -> fn() -> dict
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register(self, component: str, fn):
+        self._collectors[component] = fn
+
+    # ---------- o'qish ----------
+    def histograms(self, name: str):
+        """[(label'lar, Histogram)] — count bo'yicha kamayish tartibida."""
+        with self._lock:
+            items = [(dict(labels), h) for (n, labels), h in self._histograms.items() if n == name]
+        return sorted(items, key=lambda item: item[1].count, reverse=True)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def gauges(self):
+        for component, fn in self._collectors.items():
+            try:
+                values = fn()
+            except Exception:
+                logger.exception("Metrics: %s komponentidan o'qib bo'lmadi", component)
+                continue
+            for key, value in values.items():
+                yield component, key, value
+
+    def render(self) -> str:
+        """Prometheus text exposition formati (0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.count, h.sum) for key, h in self._histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_labels(*labels)} {value}')
+
+        for (name, labels), counts, count, total in histograms:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, '+Inf'), counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{_labels(*labels, ("le", bound))} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(*labels)} {total}')
+            lines.append(f'{metric}_count{_labels(*labels)} {count}')
+
+        for component, key, value in self.gauges():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f'{self.prefix}_{component}_{key}'
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+
+# ============================================
+# INSTRUMENTATSIYA
+# ============================================
+def instrument(callback, registry: Metrics = REGISTRY):
+    """Async handler'ni vaqt o'lchovi va xato hisoblagichi bilan o'raydi."""
+    name = getattr(callback, '__name__', repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            registry.inc('handler_errors_total', handler=name)
+            raise
+        finally:
+            registry.observe('handler_seconds', time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+
+class TimedRequest(HTTPXRequest):
+    """Bot API so'rovlari (sendMessage, getFile, ...) vaqtini metod bo'yicha yozadi."""
+
+    def __init__(self, *args, registry: Metrics = REGISTRY, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.registry = registry
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        # Fayl yuklash manzilida metod o'rniga fayl yo'li bo'ladi
+        endpoint = 'downloadFile' if '/file/bot' in url else url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            self.registry.inc('telegram_errors_total', method=endpoint)
+            raise
+        finally:
+            self.registry.observe('telegram_seconds', time.perf_counter() - started, method=endpoint)
+
+
+# ============================================
+# PROMETHEUS ENDPOINT
+# ============================================
+async def serve(host: str, port: int, registry: Metrics = REGISTRY):
+    """GET /metrics ga javob beradigan minimal HTTP server (faqat lokal scrape uchun)."""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Sarlavhalar o'qib tashlanadi
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', registry.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not Found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+GLOBAL_RATE = 25  # xabar/soniya — barcha chatlar bo'yicha
+PRIVATE_RATE = 1  # xabar/soniya — bitta shaxsiy chatga
+GROUP_RATE = 20 / 60  # xabar/soniya — bitta guruhga
+WORKERS = 4
+MAX_RETRIES = 5
+MAX_TEXT = 4096
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# CHIQUVCHI XABARLAR NAVBATI
+# ============================================
+class Outbox:
+    """Telegram'ga yuboriladigan xabarlar navbati.
+
+    send() darhol qaytadi. Ishchilar har bir chat va umumiy flood
+    limitlarini hisobga olib yuboradi, RetryAfter'da kutib qayta urinadi.
+    Bitta chatga ketma-ket navbatga tushgan oddiy matnlar birlashtiriladi.
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self.bot = None
+        self._queues = {}  # chat_id -> deque[(text, kwargs, urinishlar)]
+        self._ready = None
+        self._scheduled = set()
+        self._chat_next = {}
+        self._global_next = 0.0
+        self._tasks = []
+
+        # Metrikalar
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def start(self, bot):
+        self.bot = bot
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for chat_id in self._queues:
+            self._schedule(chat_id)
+
+    async def close(self, timeout: float = 10):
+        if self._ready is not None and self._queues:
+            try:
+                await asyncio.wait_for(self._drained(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Outbox: %d ta chatga xabar yuborilmay qoldi", len(self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drained(self):
+        while self._queues:
+            await asyncio.sleep(0.05)
+
+    # ---------- navbatga qo'yish ----------
+    def send(self, chat_id: int, text: str, **kwargs):
+        queue = self._queues.setdefault(chat_id, deque())
+        if queue and self._can_merge(queue[-1], text, kwargs):
+            last_text, last_kwargs, attempts = queue[-1]
+            queue[-1] = (f"{last_text}\n\n{text}", last_kwargs, attempts)
+            self.coalesced += 1
+        else:
+            queue.append((text, kwargs, 0))
+        self._schedule(chat_id)
+
+    @staticmethod
+    def _can_merge(item, text, kwargs) -> bool:
+        last_text, last_kwargs, attempts = item
+        return (
+            attempts == 0
+            and 'reply_markup' not in kwargs
+            and 'reply_markup' not in last_kwargs
+            and last_kwargs == kwargs
+            and len(last_text) + len(text) + 2 <= MAX_TEXT
+        )
+
+    def _schedule(self, chat_id: int):
+        if self._ready is None or chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        self._ready.put_nowait(chat_id)
+
+    # ---------- yuborish ----------
+    def _reserve(self, chat_id: int) -> float:
+        """Chat va umumiy limit bo'yicha navbatdagi yuborish vaqtigacha kutish."""
+        now = time.monotonic()
+        rate = GROUP_RATE if chat_id < 0 else PRIVATE_RATE
+        start = max(now, self._chat_next.get(chat_id, 0.0), self._global_next)
+        self._chat_next[chat_id] = start + 1 / rate
+        self._global_next = start + 1 / GLOBAL_RATE
+        return start - now
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._queues.get(chat_id)
+            try:
+                if queue:
+                    delay = self._reserve(chat_id)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await self._deliver(chat_id, queue)
+            finally:
+                # Xato bo'lsa ham chat qayta navbatga qo'yiladi — aks holda osilib qoladi
+                self._scheduled.discard(chat_id)
+                if queue:
+                    self._schedule(chat_id)
+                else:
+                    self._queues.pop(chat_id, None)
+                    self._chat_next.pop(chat_id, None)
+
+    async def _deliver(self, chat_id: int, queue: deque):
+        text, kwargs, attempts = queue[0]
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        except RetryAfter as e:
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            self._chat_next[chat_id] = time.monotonic() + delay
+            self._global_next = max(self._global_next, time.monotonic() + delay)
+            self._retry(chat_id, queue, text, kwargs, attempts)
+            return
+        except (Forbidden, BadRequest) as e:
+            logger.info("Outbox: %s chatga yuborib bo'lmadi: %s", chat_id, e)
+            queue.popleft()
+            self.dropped += 1
+            return
+        except NetworkError:
+            self._chat_next[chat_id] = time.monotonic() + 2 ** attempts
+            self._retry(chat_id, queue, text, kwargs, attempts)
+            return
+        except TelegramError as e:
+            logger.warning("Outbox: %s chatga yuborib bo'lmadi: %s", chat_id, e)
+            queue.popleft()
+            self.dropped += 1
+            return
+        except Exception:
+            # Kutilmagan xato — ishchi o'lmasligi uchun xabar tashlanadi
+            logger.exception("Outbox: %s chatga xabar yuborishda kutilmagan xato", chat_id)
+            queue.popleft()
+            self.dropped += 1
+            return
+        queue.popleft()
+        self.sent += 1
+
+    def _retry(self, chat_id, queue, text, kwargs, attempts):
+        if attempts + 1 >= MAX_RETRIES:
+            logger.warning("Outbox: %s chatga xabar %d urinishdan keyin tashlandi", chat_id, MAX_RETRIES)
+            queue.popleft()
+            self.dropped += 1
+            return
+        queue[0] = (text, kwargs, attempts + 1)
+        self.retried += 1
+
+    def metrics(self) -> dict:
+        return {
+            'pending': sum(len(queue) for queue in self._queues.values()),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'dropped': self.dropped,
+        }
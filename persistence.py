@@ -0,0 +1,95 @@
+import json
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+PERSISTENCE_INTERVAL = 30  # soniya — PTB shu oraliqda o'zgarishlarni beradi
+
+
+# ============================================
+# SQLITE PERSISTENCE
+# ============================================
+class SQLitePersistence(BasePersistence):
+    """user_data va ConversationHandler holatlarini homework.db'da saqlaydi.
+
+    PTB o'zgarishlarni har update'da emas, PERSISTENCE_INTERVAL oralig'ida
+    beradi; ular WriteBehind navbati orqali bitta tranzaksiyada yoziladi.
+    Jadvallar bot.py migratsiyalarida yaratiladi.
+    """
+
+    def __init__(self, storage, writer, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.storage = storage
+        self.writer = writer
+
+    # ---------- o'qish ----------
+    async def get_user_data(self):
+        rows = await self.storage.fetchall('SELECT user_id, data FROM persistence_user_data')
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str):
+        rows = await self.storage.fetchall(
+            'SELECT key, state FROM persistence_conversations WHERE name = ?', (name,)
+        )
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    # ---------- yozish ----------
+    async def update_user_data(self, user_id: int, data: dict):
+        if data:
+            self.writer.add('''
+                INSERT INTO persistence_user_data (user_id, data) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET data = excluded.data
+            ''', (user_id, json.dumps(data, ensure_ascii=False)))
+        else:
+            self.writer.add('DELETE FROM persistence_user_data WHERE user_id = ?', (user_id,))
+
+    async def drop_user_data(self, user_id: int):
+        self.writer.add('DELETE FROM persistence_user_data WHERE user_id = ?', (user_id,))
+
+    async def update_conversation(self, name: str, key, new_state):
+        key = json.dumps(list(key))
+        if new_state is None:
+            self.writer.add('DELETE FROM persistence_conversations WHERE name = ? AND key = ?', (name, key))
+        else:
+            self.writer.add('''
+                INSERT INTO persistence_conversations (name, key, state) VALUES (?, ?, ?)
+                ON CONFLICT(name, key) DO UPDATE SET state = excluded.state
+            ''', (name, key, json.dumps(new_state)))
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def flush(self):
+        await self.writer.flush()
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+DB_PATH = 'homework.db'
+POOL_SIZE = 4
+STATEMENT_CACHE = 128
+
+# Write-behind: navbat shu vaqt (soniya) yoki shuncha yozuvdan keyin yoziladi
+FLUSH_INTERVAL = 0.05
+FLUSH_MAX_BATCH = 200
+
+# Har bir ulanish uchun PRAGMA'lar
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # ~16 MB (manfiy qiymat — KiB)
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# ULANISHLAR HOVUZI
+# ============================================
+class Storage:
+    """Doimiy SQLite ulanishlari hovuzi.
+
+    Bloklovchi chaqiruvlar alohida executor'da bajariladi, shuning uchun
+    asyncio loop disk I/O kutib qolmaydi.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.Queue()
+        self._executor = None
+
+    def open(self):
+        if self._executor is not None:
+            return
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='db')
+
+    def close(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # cached_statements — tayyorlangan so'rovlarni qayta ishlatish
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        for name, value in PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def migrate(self, migrations):
+        """Sxemani PRAGMA user_version bo'yicha bosqichma-bosqich yangilash.
+
+        migrations — (versiya, fn(conn)) juftliklari ro'yxati. Har bir qadam
+        o'z tranzaksiyasida bajariladi va mavjud bazani joyida yangilaydi.
+        """
+        self.open()
+        with self.connection() as conn:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, fn in sorted(migrations, key=lambda m: m[0]):
+                if version <= current:
+                    continue
+                try:
+                    conn.execute('BEGIN')
+                    fn(conn)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                current = version
+            return current
+
+    def set_trace(self, callback):
+        """Hovuzdagi barcha ulanishlarga sqlite3 trace callback (None — o'chirish).
+
+        Har bir bajarilgan SQL bilan chaqiriladi — faqat profil/benchmark uchun.
+        """
+        self.open()
+        conns = [self._pool.get() for _ in range(self.pool_size)]
+        try:
+            for conn in conns:
+                conn.set_trace_callback(callback)
+        finally:
+            for conn in conns:
+                self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def call(self, fn, *args):
+        """fn(conn, *args) ni bitta tranzaksiyada sinxron bajarish."""
+        self.open()
+        started = time.perf_counter()
+        try:
+            with self.connection() as conn:
+                try:
+                    result = fn(conn, *args)
+                    conn.commit()
+                    return result
+                except BaseException:
+                    conn.rollback()
+                    raise
+        finally:
+            REGISTRY.observe('db_seconds', time.perf_counter() - started, op=fn.__name__.lstrip('_'))
+
+    def _call_queued(self, queued: float, fn, *args):
+        # Executor navbatida kutilgan vaqt alohida — hovuz yetishmasligini ko'rsatadi
+        REGISTRY.observe('db_wait_seconds', time.perf_counter() - queued)
+        return self.call(fn, *args)
+
+    async def run(self, fn, *args):
+        """fn(conn, *args) ni executor'da bajarish va natijani kutish."""
+        self.open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call_queued, time.perf_counter(), fn, *args)
+
+    # ---------- qisqa yo'llar ----------
+    async def execute(self, sql: str, params=()) -> int:
+        return await self.run(_execute, sql, params)
+
+    async def executemany(self, sql: str, seq) -> int:
+        return await self.run(_executemany, sql, seq)
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.run(_fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.run(_fetchall, sql, params)
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+
+def _executemany(conn, sql, seq):
+    return conn.executemany(sql, seq).rowcount
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+# ============================================
+# WRITE-BEHIND NAVBAT
+# ============================================
+def _apply_batch(conn, batch):
+    for sql, params in batch:
+        conn.execute(sql, params)
+
+
+class WriteBehind:
+    """Yozuvlarni navbatga yig'ib, bitta tranzaksiyada bazaga yozadi.
+
+    Navbat FLUSH_INTERVAL o'tgach yoki FLUSH_MAX_BATCH ta yozuv yig'ilganda
+    bo'shatiladi. close() qolgan yozuvlarni albatta yozib tugatadi.
+    """
+
+    def __init__(self, storage: Storage, interval: float = FLUSH_INTERVAL, max_batch: int = FLUSH_MAX_BATCH):
+        self.storage = storage
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending = []
+        self._wakeup = None
+        self._lock = None
+        self._task = None
+        self._stopping = False
+
+        # Metrikalar
+        self.batches = 0
+        self.events = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._loop())
+        if self._pending:
+            self._wakeup.set()
+
+    async def close(self):
+        if self._task is not None:
+            # Tsikl bekor qilinmaydi: bajarilayotgan flush tugaydi, keyin tsikl chiqadi
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def add(self, sql: str, params=()):
+        self._pending.append((sql, params))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_batch and not self._stopping:
+                # Ko'proq yozuv yig'ilishi uchun biroz kutamiz
+                await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind navbatini yozib bo'lmadi")
+                await asyncio.sleep(self.interval)
+                self._wakeup.set()
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            started = time.perf_counter()
+            run = asyncio.ensure_future(self.storage.run(_apply_batch, batch))
+            try:
+                await asyncio.shield(run)
+            except asyncio.CancelledError:
+                # Executor'dagi partiya baribir yoziladi — tugashini kutamiz va
+                # faqat haqiqatan yozilmagan bo'lsa navbatga qaytaramiz
+                await asyncio.wait({run})
+                if run.exception() is not None:
+                    self._pending[:0] = batch
+                raise
+            except BaseException:
+                # Yo'qolmasligi uchun navbat boshiga qaytariladi
+                self._pending[:0] = batch
+                raise
+            latency = time.perf_counter() - started
+
+            self.batches += 1
+            self.events += len(batch)
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+
+    def metrics(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'batches': self.batches,
+            'events': self.events,
+            'flush_last_seconds': self.last_latency,
+            'flush_max_seconds': self.max_latency,
+            'flush_avg_seconds': self.total_latency / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,254 @@
+import builtins
+import hashlib
+import keyword
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict, defaultdict
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+STORE_DIR = 'submissions'
+CACHE_DIR = os.path.join(STORE_DIR, 'cache')
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+SHINGLE_SIZE = 5  # tokenlar soni
+NUM_PERM = 64
+BANDS = 16  # LSH: 16 ta band x 4 qator
+SIMILARITY_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+_KEEP = frozenset(keyword.kwlist) | frozenset(dir(builtins))
+
+
+def _permutations():
+    # Deterministik (a, b) juftliklari — imzolar qayta ishga tushganda ham mos keladi
+    perms = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f'perm-{i}'.encode(), digest_size=16).digest()
+        a, b = struct.unpack('<QQ', digest)
+        perms.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+    return perms
+
+
+_PERMS = _permutations()
+
+
+# ============================================
+# KONTENT BO'YICHA OMBOR
+# ============================================
+class ContentStore:
+    """Fayllarni SHA-256 xeshi bo'yicha diskda saqlaydi (bir xil fayl bir marta)."""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def put(self, data: bytes) -> str:
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp{threading.get_ident()}"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return content_hash
+
+    def get(self, content_hash: str) -> bytes:
+        with open(self.path(content_hash), 'rb') as f:
+            return f.read()
+
+
+# ============================================
+# MINHASH
+# ============================================
+def _tokens(text: str):
+    # O'zgaruvchi nomlarini almashtirish o'xshashlikni yashirmasligi uchun
+    # kalit so'z va builtin'lardan boshqa identifikatorlar bir xil tokenga aylanadi
+    return [
+        'ID' if (token[0].isalpha() or token[0] == '_') and token not in _KEEP else token
+        for token in _TOKEN_RE.findall(text)
+    ]
+
+
+def minhash(text: str):
+    """Token shingle'lari bo'yicha NUM_PERM uzunlikdagi MinHash imzosi."""
+    tokens = _tokens(text)
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {' '.join(tokens)}
+    else:
+        shingles = {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'little') for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMS)
+
+
+def similarity(sig_a, sig_b) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def pack_signature(signature) -> bytes:
+    return struct.pack(f'<{NUM_PERM}Q', *signature)
+
+
+def unpack_signature(blob: bytes):
+    return struct.unpack(f'<{NUM_PERM}Q', blob)
+
+
+# ============================================
+# O'XSHASHLIK INDEKSI
+# ============================================
+class SimilarityIndex:
+    """Har bir dars uchun MinHash LSH indeksi.
+
+    Imzo BANDS ta bo'lakka ajratiladi; hech bo'lmasa bitta bo'lagi mos
+    kelgan topshiriqlargina solishtiriladi, shuning uchun qidiruv dars
+    hajmiga bog'liq emas.
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(set)  # (dars, band, bo'lak) -> {homework_id}
+        self._signatures = {}  # homework_id -> (dars, imzo)
+
+    @staticmethod
+    def _bands(signature):
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def add(self, lesson_number: int, homework_id: int, signature):
+        self.remove(homework_id)
+        self._signatures[homework_id] = (lesson_number, signature)
+        for band, chunk in self._bands(signature):
+            self._buckets[(lesson_number, band, chunk)].add(homework_id)
+
+    def remove(self, homework_id: int):
+        entry = self._signatures.pop(homework_id, None)
+        if entry is None:
+            return
+        lesson_number, signature = entry
+        for band, chunk in self._bands(signature):
+            bucket = self._buckets.get((lesson_number, band, chunk))
+            if bucket is not None:
+                bucket.discard(homework_id)
+                if not bucket:
+                    del self._buckets[(lesson_number, band, chunk)]
+
+    def query(self, lesson_number: int, signature, exclude: int = None, threshold: float = SIMILARITY_THRESHOLD):
+        """[(homework_id, o'xshashlik)] — eng o'xshashi birinchi."""
+        candidates = set()
+        for band, chunk in self._bands(signature):
+            candidates |= self._buckets.get((lesson_number, band, chunk), set())
+        candidates.discard(exclude)
+
+        matches = []
+        for homework_id in candidates:
+            score = similarity(signature, self._signatures[homework_id][1])
+            if score >= threshold:
+                matches.append((homework_id, score))
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches
+
+
+# ============================================
+# YUKLANGAN FAYLLAR KESHI
+# ============================================
+class FileCache:
+    """file_id bo'yicha diskdagi LRU kesh, umumiy hajmi max_bytes bilan cheklangan.
+
+    Metodlar bloklovchi (disk I/O), shuning uchun event loop'dan
+    asyncio.to_thread orqali chaqiriladi.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # kalit -> hajm
+        self._lock = threading.Lock()
+        self._loaded = False
+
+        # Metrikalar
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(file_id: str) -> str:
+        return hashlib.sha1(file_id.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _load(self):
+        # Qayta ishga tushganda diskdagi fayllar eski->yangi tartibida tiklanadi
+        self._loaded = True
+        if not os.path.isdir(self.root):
+            return
+        entries = []
+        for name in os.listdir(self.root):
+            path = self._path(name)
+            if '.tmp' in name or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self.size += size
+
+    def get(self, file_id: str):
+        key = self._key(file_id)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, file_id: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        key = self._key(file_id)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self._path(key)}.tmp{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self.size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.size += len(data)
+            evicted = []
+            while self.size > self.max_bytes and self._entries:
+                old_key, old_size = self._entries.popitem(last=False)
+                self.size -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> dict:
+        return {
+            'files': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,38 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+from leaderboard import Leaderboard  # noqa: E402
+from storage import Storage, WriteBehind  # noqa: E402
+from submissions import SimilarityIndex  # noqa: E402
+from users import UserDirectory  # noqa: E402
+
+
+def make_user(user_id: int):
+    return SimpleNamespace(id=user_id, full_name=f"Talaba {user_id}", username=f"user{user_id}")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Vaqtinchalik faylda migratsiyalari bajarilgan baza."""
+    db = Storage(str(tmp_path / 'homework.db'))
+    db.migrate(bot.MIGRATIONS)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def app_db(storage, monkeypatch):
+    """bot modulidagi global baza, navbat va keshlarni vaqtinchalik bazaga almashtiradi."""
+    monkeypatch.setattr(bot, 'db', storage)
+    monkeypatch.setattr(bot, 'db_writer', WriteBehind(storage))
+    monkeypatch.setattr(bot, 'users', UserDirectory(storage))
+    monkeypatch.setattr(bot, 'leaderboard', Leaderboard())
+    monkeypatch.setattr(bot, '_not_done_cache', {})
+    monkeypatch.setattr(bot, 'similarity_index', SimilarityIndex())
+    return storage
@@ -0,0 +1,51 @@
+import asyncio
+
+import bot
+from conftest import make_user
+from submissions import minhash
+
+LESSON = 7
+SOURCE = "a, b = map(int, input().split())\nprint(a + b)\n"
+
+
+async def _fingerprint(user_id: int, file_id: str):
+    # ingest_submission'ning yuklab olishdan keyingi qismi
+    row = await bot.db.fetchone('SELECT id FROM homework WHERE user_id = ? AND lesson_number = ?',
+                                (user_id, LESSON))
+    signature = minhash(SOURCE)
+    if await bot.db.run(bot._save_fingerprint, row[0], file_id, LESSON, 'hash', signature, None):
+        bot.similarity_index.add(LESSON, row[0], signature)
+    return row[0], signature
+
+
+def test_resubmission_drops_old_fingerprint(app_db):
+    user = make_user(1)
+
+    async def run():
+        await bot.submit_homework(user, LESSON, 'file-1', 'main.py')
+        hw_id, signature = await _fingerprint(user.id, 'file-1')
+        assert bot.similarity_index.query(LESSON, signature)
+
+        # Yangi fayl hech qachon yuklanmaydi (masalan, INGEST_MAX_BYTES dan katta)
+        await bot.submit_homework(user, LESSON, 'file-2', 'main.py')
+        return hw_id, signature
+
+    hw_id, signature = asyncio.run(run())
+    assert bot.similarity_index.query(LESSON, signature) == []
+    fingerprints = app_db.call(lambda conn: conn.execute(
+        'SELECT COUNT(*) FROM submission_fingerprints WHERE homework_id = ?', (hw_id,)).fetchone()[0])
+    assert fingerprints == 0
+
+
+def test_stale_ingest_does_not_restore_fingerprint(app_db):
+    user = make_user(1)
+
+    async def run():
+        await bot.submit_homework(user, LESSON, 'file-1', 'main.py')
+        await bot.submit_homework(user, LESSON, 'file-2', 'main.py')
+        # Eski faylning kechikkan yuklanishi
+        return await _fingerprint(user.id, 'file-1')
+
+    _, signature = asyncio.run(run())
+    assert bot.similarity_index.query(LESSON, signature) == []
+    assert app_db.call(lambda conn: conn.execute('SELECT COUNT(*) FROM submission_fingerprints').fetchone()[0]) == 0
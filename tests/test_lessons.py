@@ -0,0 +1,60 @@
+import pytest
+
+import bot
+
+# (caption, fayl nomi, kutilgan dars raqami). Shablonlar ustuvorligi asl
+# ketma-ket re.search'lar bilan bir xil bo'lishi kerak.
+LESSON_CORPUS = [
+    ("#homework 5-dars", "main.py", 5),
+    ("#uyishi Dars 12", "vazifa.py", 12),
+    ("#HW 7", "solution.py", 7),
+    ("#vazifa", "lesson_3.py", 3),
+    ("#hw hw-15", "x.py", 15),
+    ("", "Homework_8_final.py", 8),
+    ("#uyishi 3-chi dars", "main.py", 3),
+    ("#vazifa", "5chi.py", 5),
+    ("#uyishi dars-1", None, 1),
+    ("#homework", "Dars_100.py", 100),
+    ("#homework\n11", "file.py", 11),
+    ("#homework", "17.py", 17),
+    ("#hw main.py 3", "main.py", 3),
+    (" 99 ", None, 99),
+    # Oldingi shablon g'olib, hatto matnda keyinroq kelsa ham
+    ("#uyishi  lesson 2  dars 6", "d.py", 6),
+    ("#hw lesson 9", "dars4.py", 4),
+    # 1..100 dan tashqaridagi moslik keyingi shablonga o'tkazib yuboriladi
+    ("#homework 101 dars 4", "a.py", 4),
+    ("#homework 0-dars 9", "b.py", 9),
+    ("dars200 lesson 20", "e.py", 20),
+    ("#hw dars 0 lesson 1", "main.py", 1),
+    ("#vazifa #42", "c.py", 2),
+    ("#hw 250", "main.py", None),
+    ("#homework", "task.py", None),
+    ("", "", None),
+    (None, None, None),
+]
+
+HASHTAG_CORPUS = [
+    ("#homework 5-dars", True),
+    ("#HomeWork x", True),
+    ("Bugungi #Uyishi", True),
+    ("#vazifa", True),
+    ("#hwx", True),
+    ("homework #hw", True),
+    ("uyishi", False),
+    ("#Uy ishi", False),
+    ("homework 5", False),
+    ("", False),
+    (None, False),
+]
+
+
+@pytest.mark.parametrize('caption, filename, expected', LESSON_CORPUS)
+def test_lesson_number(caption, filename, expected):
+    assert bot.parse_submission(caption, filename)[1] == expected
+
+
+@pytest.mark.parametrize('caption, expected', HASHTAG_CORPUS)
+def test_hashtag(caption, expected):
+    # Hashteg faqat caption'dan olinadi
+    assert bot.parse_submission(caption, "hw_1.py")[0] is expected
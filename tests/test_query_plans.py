@@ -0,0 +1,50 @@
+import bot
+
+
+def _plans(storage, fn, *args):
+    """fn bajargan har bir SELECT uchun EXPLAIN QUERY PLAN satrlari: {sql: [detail, ...]}."""
+    statements = []
+    storage.set_trace(statements.append)
+    try:
+        storage.call(fn, *args)
+    finally:
+        storage.set_trace(None)
+
+    plans = {}
+    with storage.connection() as conn:
+        for sql in statements:
+            if sql.lstrip().upper().startswith('SELECT'):
+                plans[' '.join(sql.split())] = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    return plans
+
+
+def _plan_for(plans, fragment):
+    matches = [plan for sql, plan in plans.items() if fragment in sql]
+    assert matches, f"{fragment!r} so'rovi bajarilmadi"
+    return matches[0]
+
+
+def test_submit_looks_up_homework_by_user_lesson_index(storage):
+    plans = _plans(storage, bot._submit_homework, 1, ('Ali', 'ali'), 3, 'file-1', 'main.py')
+    plan = _plan_for(plans, 'FROM homework WHERE user_id =')
+    assert any('USING INDEX idx_homework_user_lesson' in step for step in plan), plan
+
+
+def test_review_page_walks_lesson_time_index(storage):
+    storage.call(bot._submit_homework, 1, ('Ali', 'ali'), 3, 'file-1', 'main.py')
+    plans = _plans(storage, bot._review_page, 3, 'f', 0)
+
+    plan = _plan_for(plans, 'WHERE h.lesson_number =')
+    assert any('USING INDEX idx_homework_lesson_time' in step for step in plan), plan
+    # ORDER BY h.timestamp, h.id indeks tartibidan olinadi
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+    for fragment in ('AND (timestamp, id) <', 'AND (timestamp, id) >'):
+        plan = _plan_for(plans, fragment)
+        assert any('idx_homework_lesson_time' in step for step in plan), plan
+
+
+def test_leaderboard_history_uses_covering_index(storage):
+    plans = _plans(storage, bot._leaderboard_rows)
+    plan = _plan_for(plans, 'FROM score_history')
+    assert any('USING COVERING INDEX idx_score_history_time_user' in step for step in plan), plan
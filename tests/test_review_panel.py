@@ -0,0 +1,66 @@
+import asyncio
+from html.parser import HTMLParser
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+import bot
+
+LESSON = 4
+
+
+class _Tags(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.open = []
+        self.text = ''
+
+    def handle_starttag(self, tag, attrs):
+        self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.open.pop() == tag
+
+    def handle_data(self, data):
+        self.text += data
+
+
+def _submit(user_id: int, full_name: str, filename: str):
+    user = SimpleNamespace(id=user_id, full_name=full_name, username=None)
+    return bot.submit_homework(user, LESSON, f"file-{user_id}", filename)
+
+
+def test_page_escapes_names_and_filenames(app_db):
+    async def run():
+        await _submit(1, "Ali_<b>*`[", "my_file<1>.py")
+        await _submit(2, "Vali & Co", "main.py")
+        return await bot.render_review_page(LESSON)
+
+    text, _ = asyncio.run(run())
+    tags = _Tags()
+    tags.feed(text)
+    tags.close()
+    assert tags.open == []
+    assert "Ali_<b>*`[" in tags.text
+    assert "my_file<1>.py" in tags.text
+    assert "Vali & Co" in tags.text
+
+
+class _Bot:
+    def __init__(self, error):
+        self.error = error
+
+    async def edit_message_text(self, **kwargs):
+        assert kwargs['parse_mode'] == 'HTML'
+        raise self.error
+
+
+def test_refresh_ignores_only_not_modified(app_db):
+    async def refresh(error):
+        await _submit(1, "Ali", "main.py")
+        await bot.refresh_review_panel(_Bot(error), 1, 1, LESSON, 0)
+
+    asyncio.run(refresh(BadRequest("Message is not modified: specified new message content is the same")))
+    with pytest.raises(BadRequest):
+        asyncio.run(refresh(BadRequest("Can't parse entities: can't find end of the entity")))
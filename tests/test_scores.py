@@ -0,0 +1,38 @@
+import asyncio
+
+import bot
+from conftest import make_user
+
+
+def _score(storage, user_id: int):
+    return storage.call(lambda conn: conn.execute('SELECT score FROM scores WHERE user_id = ?',
+                                                  (user_id,)).fetchone()[0])
+
+
+def test_set_score_commutes_with_direct_score_writes(app_db):
+    user = make_user(1)
+
+    async def run():
+        bot.set_score(user.id, 100)
+        # Navbatdagi o'zgarishdan oldin +3 to'g'ridan-to'g'ri bazaga yoziladi
+        _, first, points = await bot.submit_homework(user, 3, 'file-1', 'main.py')
+        assert (first, points) == (True, 3)
+        await bot.db_writer.close()
+
+    asyncio.run(run())
+    assert bot.leaderboard.totals[user.id] == 103
+    assert _score(app_db, user.id) == 103
+
+
+def test_set_score_records_history_delta(app_db):
+    user = make_user(1)
+
+    async def run():
+        await bot.submit_homework(user, 3, 'file-1', 'main.py')
+        assert bot.set_score(user.id, 10) == 3
+        await bot.db_writer.close()
+
+    asyncio.run(run())
+    assert _score(app_db, user.id) == 10
+    history = app_db.call(lambda conn: conn.execute('SELECT SUM(points) FROM score_history').fetchone()[0])
+    assert history == 10
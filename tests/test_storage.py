@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+import storage as storage_module
+from storage import WriteBehind
+
+
+def test_close_during_flush_writes_batch_once(storage, monkeypatch):
+    storage.call(lambda conn: conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, value)'))
+    apply_batch = storage_module._apply_batch
+
+    def slow_apply_batch(conn, batch):
+        time.sleep(0.2)
+        apply_batch(conn, batch)
+
+    monkeypatch.setattr(storage_module, '_apply_batch', slow_apply_batch)
+
+    async def run():
+        writer = WriteBehind(storage, interval=0)
+        writer.start()
+        writer.add('INSERT INTO events (value) VALUES (?)', (1,))
+        await asyncio.sleep(0.05)  # partiya executor'da yozilmoqda
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert storage.call(lambda conn: conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]) == 1
+    assert writer.metrics()['pending'] == 0
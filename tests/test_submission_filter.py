@@ -0,0 +1,51 @@
+import time
+
+import pytest
+from telegram import Update
+
+import bot
+
+GROUP_CHAT = {'id': -1001000000000, 'type': 'supergroup', 'title': 'Test'}
+
+
+def _document_update(kind: str, caption: str = "#homework 3", filename: str = "main.py") -> Update:
+    message = {
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': GROUP_CHAT,
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Ali'},
+        'caption': caption,
+        'document': {'file_id': 'F1', 'file_unique_id': 'F1', 'file_name': filename},
+    }
+    if kind == 'edited_message':
+        message['edit_date'] = int(time.time())
+    return Update.de_json({'update_id': 1, kind: message}, None)
+
+
+@pytest.fixture
+def accepted(monkeypatch):
+    monkeypatch.setattr(bot, 'MODE', 'HASHTAG')
+    return bot.submission_filter()
+
+
+def test_accepts_new_group_document(accepted):
+    # handle_file dars raqamini qayta ajratmaydi — filtr natijasidan oladi
+    assert accepted.check_update(_document_update('message')) == {'submission': [3]}
+
+
+def test_passes_missing_lesson_number_to_handler(accepted):
+    assert accepted.check_update(_document_update('message', "#homework", "main.py")) == {'submission': [None]}
+
+
+def test_other_modes_do_not_require_hashtag(monkeypatch):
+    monkeypatch.setattr(bot, 'MODE', 'CAPTION_ONLY')
+    assert bot.submission_filter().check_update(_document_update('message', "5-dars")) == {'submission': [5]}
+
+
+def test_rejects_edited_caption(accepted):
+    assert not accepted.check_update(_document_update('edited_message'))
+
+
+@pytest.mark.parametrize('caption, filename', [("3-dars", "main.py"), ("#homework 3", "main.js")])
+def test_rejects_missing_hashtag_or_extension(accepted, caption, filename):
+    assert not accepted.check_update(_document_update('message', caption, filename))
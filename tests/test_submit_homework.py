@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+import bot
+from conftest import make_user as _user
+
+USERS = 40
+LESSON = 5
+
+
+def _submit_all(user_ids, suffix: str):
+    async def run():
+        return await asyncio.gather(*(
+            bot.submit_homework(_user(user_id), LESSON, f"file-{user_id}-{suffix}", 'main.py')
+            for user_id in user_ids
+        ))
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def slow_reads(monkeypatch):
+    """lesson_stats o'qilgandan keyin yozishgacha bo'lgan oraliqni kengaytiradi.
+
+    Tranzaksiya yozishni boshidan qulflamasa (BEGIN IMMEDIATE o'rniga BEGIN),
+    bir nechta topshiriq bir xil holatni ko'radi yoki yozishda "database is locked" oladi.
+    """
+    get_lesson_stats = bot.get_lesson_stats
+
+    def slow_lesson_stats(conn, lesson_number):
+        stats = get_lesson_stats(conn, lesson_number)
+        time.sleep(0.005)
+        return stats
+
+    monkeypatch.setattr(bot, 'get_lesson_stats', slow_lesson_stats)
+    return get_lesson_stats
+
+
+def test_concurrent_submissions_award_one_first(app_db, slow_reads):
+    get_lesson_stats = slow_reads
+    user_ids = range(1, USERS + 1)
+    # Profillar keshda — tranzaksiya users yozuvisiz, to'g'ridan-to'g'ri o'qishdan boshlanadi
+    for user_id in user_ids:
+        user = _user(user_id)
+        asyncio.run(bot.users.upsert(user.id, user.full_name, user.username))
+    results = _submit_all(user_ids, 'a')
+
+    assert all(is_new for is_new, _, _ in results)
+    assert sum(first for _, first, _ in results) == 1
+    assert sorted(points for _, _, points in results) == [1] * (USERS - 1) + [3]
+
+    assert app_db.call(get_lesson_stats, LESSON) == (USERS, USERS, 0, 0)
+
+    scores = dict(app_db.call(lambda conn: conn.execute('SELECT user_id, score FROM scores').fetchall()))
+    assert sum(scores.values()) == 3 + (USERS - 1)
+    assert scores == bot.leaderboard.totals
+    history = app_db.call(lambda conn: conn.execute('SELECT COUNT(*) FROM score_history').fetchone()[0])
+    assert history == USERS
+
+
+def test_concurrent_resubmissions_keep_counts(app_db, slow_reads):
+    user_ids = range(1, USERS + 1)
+    _submit_all(user_ids, 'a')
+    # Ikkinchi bosqichda profillar keshda — tranzaksiyalar o'qishdan boshlanadi
+    results = _submit_all(user_ids, 'b')
+
+    assert results == [(False, False, 0)] * USERS
+    assert app_db.call(slow_reads, LESSON) == (USERS, USERS, 0, 0)
+    attempts = app_db.call(lambda conn: conn.execute('SELECT SUM(attempts) FROM homework').fetchone()[0])
+    assert attempts == 2 * USERS
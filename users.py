@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+# ============================================
+# SOZLAMALAR
+# ============================================
+USER_CACHE_SIZE = 2048
+
+UPSERT_USER_SQL = '''
+    INSERT INTO users (user_id, full_name, username)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        full_name = excluded.full_name,
+        username = excluded.username
+'''
+
+
+# ============================================
+# FOYDALANUVCHILAR KATALOGI
+# ============================================
+class UserDirectory:
+    """users jadvalining LRU bilan cheklangan xotiradagi nusxasi.
+
+    Ism so'rovlari keshdan beriladi, bazaga faqat ism yoki username
+    haqiqatan o'zgarganda yoziladi.
+    """
+
+    def __init__(self, storage, capacity: int = USER_CACHE_SIZE):
+        self.storage = storage
+        self.capacity = capacity
+        self._entries = OrderedDict()  # user_id -> (full_name, username)
+
+        # Metrikalar
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def remember(self, user_id: int, full_name: str, username: str):
+        self._entries[user_id] = (full_name, username)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def changed(self, user_id: int, full_name: str, username: str) -> bool:
+        """Keshdagi profil bilan farq qiladimi (keshda yo'q bo'lsa ham True)."""
+        if self._entries.get(user_id) == (full_name, username):
+            self._entries.move_to_end(user_id)
+            self.skipped_writes += 1
+            return False
+        return True
+
+    async def upsert(self, user_id: int, full_name: str, username: str) -> bool:
+        """Profilni saqlaydi; bazaga yozilgan bo'lsa True."""
+        if not self.changed(user_id, full_name, username):
+            return False
+        await self.storage.execute(UPSERT_USER_SQL, (user_id, full_name, username))
+        self.writes += 1
+        self.remember(user_id, full_name, username)
+        return True
+
+    async def get_name(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        row = await self.storage.fetchone('SELECT full_name, username FROM users WHERE user_id = ?', (user_id,))
+        if row is None:
+            return None
+        full_name = row[0] or ""
+        self.remember(user_id, full_name, row[1] or "")
+        return full_name
+
+    def metrics(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'skipped_writes': self.skipped_writes,
+        }